@@ -1,24 +1,49 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
+import cloudinary.exceptions
 import io
+import os
 import requests
 import time
 import json
+import threading
+import atexit
+import uuid
+import random
+import hashlib
+import shutil
+import tempfile
+import openpyxl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from collections import OrderedDict
+from contextlib import contextmanager
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 
 # =================================================================
 # 1. KONFIGURASI UTAMA & HIDE UI
 # =================================================================
+def get_secret(key, default=None):
+    try: return st.secrets.get(key, default)
+    except: return default
+
+# STORAGE FILE: "cloudinary" (DEFAULT) ATAU "local" (FOLDER storage_root, UNTUK ON-PREM / OFFLINE)
+STORAGE_BACKEND = get_secret("storage_backend", "cloudinary")
+
 try:
-    cloudinary.config( 
-      cloud_name = st.secrets["cloud_name"], 
-      api_key = st.secrets["api_key"], 
-      api_secret = st.secrets["api_secret"],
-      secure = True
-    )
+    if STORAGE_BACKEND == "cloudinary":
+        cloudinary.config( 
+          cloud_name = st.secrets["cloud_name"], 
+          api_key = st.secrets["api_key"], 
+          api_secret = st.secrets["api_secret"],
+          secure = True
+        )
 except:
     st.error("Konfigurasi Secrets Cloudinary tidak ditemukan!")
 
@@ -39,8 +64,82 @@ st.markdown("""
 # 2. FUNGSI DATABASE & CONFIG (JSON)
 # =================================================================
 USER_DB_PATH = "so_rawan_hilang/config/users.json"
+USER_DIR = "so_rawan_hilang/config/users"
 LOG_DB_PATH = "so_rawan_hilang/config/access_logs.json"
+LOG_DIR = "so_rawan_hilang/config/access_logs"
+LOG_DAY_DIR = "so_rawan_hilang/config/access_logs_harian"
+LOG_COMPACT_LOCK_PATH = "so_rawan_hilang/config/access_logs_compact_lock.json"
 CONFIG_PATH = "so_rawan_hilang/config/project_config.json"
+MASTER_PATH = "so_rawan_hilang/master_utama.xlsx"
+MASTER_COMPILED_PATH = "so_rawan_hilang/master_utama.parquet"
+# SHARD MASTER PER TOKO + DIRECTORY TOKO, FOLDER BARU TIAP UPLOAD MASTER
+MASTER_SHARD_DIR = "so_rawan_hilang/master_toko"
+SHARD_UPLOAD_WORKERS = 8
+RESULT_DIR = "so_rawan_hilang/hasil"
+
+# BATAS PARALEL DOWNLOAD & PARSE FILE HASIL TOKO SAAT REKAP
+REKAP_FETCH_WORKERS = 16
+
+# HAPUS MASSAL: MAKS 100 PUBLIC_ID PER CALL delete_resources
+DELETE_BATCH_SIZE = 100
+DELETE_WORKERS = 4
+
+# EXPORT REKAP DITULIS BERTAHAP KE DISK (PER CHUNK BARIS)
+REKAP_EXPORT_DIR = os.path.join(tempfile.gettempdir(), "so_rawan_hilang_rekap")
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_FORMATS = {"xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "csv": "text/csv", "parquet": "application/octet-stream"}
+
+# STATE REKAP PER PROJECT (VERSI FILE TOKO YANG SUDAH DIGABUNG + HASIL MERGE)
+REKAP_DIR = "so_rawan_hilang/rekap"
+
+# JOB REKAP DI BACKGROUND: STATE DISIMPAN TIAP SEKIAN DETIK, DIANGGAP TERPUTUS KALAU TIDAK UPDATE SELAMA INI, POLLING UI
+REKAP_JOB_SAVE_SECONDS = 5
+REKAP_JOB_STALE_SECONDS = 300
+REKAP_POLL_SECONDS = 2
+
+# CACHE ISI FILE (BLOB) PER PROSES: RAM LRU + FOLDER DISK (BERTAHAN SAAT RESTART)
+BLOB_MEM_BYTES = 256 * 1024 * 1024
+BLOB_DISK_BYTES = 2 * 1024 * 1024 * 1024
+BLOB_DISK_DIR = os.path.join(tempfile.gettempdir(), "so_rawan_hilang_blobs")
+
+# MASTER TANPA master_version DI CONFIG (UPLOAD LAMA) DICEK ULANG TIAP INTERVAL INI
+MASTER_RECHECK_SECONDS = 60
+
+# BATAS BUCKET HISTOGRAM LATENCY (DETIK) & INTERVAL TULIS FILE METRIK PROMETHEUS (secrets metrics_textfile)
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+METRICS_FLUSH_SECONDS = 15
+
+# HTTP / API STORAGE: MAKS REQUEST BERSAMAAN PER PROSES, RETRY, BACKOFF AWAL & BATAS WAKTU API (DETIK)
+HTTP_MAX_INFLIGHT = 32
+HTTP_RETRIES = 3
+HTTP_BACKOFF_SECONDS = 0.25
+API_BUDGET_SECONDS = 60
+
+# SUBMIT ULANG HANYA MENGIRIM BARIS YANG BERUBAH (DELTA); SETELAH SEKIAN DELTA FILE PENUH DIKIRIM ULANG (COMPACTION)
+DELTA_COMPACT_AFTER = 5
+
+# DRAF INPUTAN YANG BELUM DIKIRIM DISIMPAN DI PROSES SELAMA INI (DETIK)
+DRAFT_TTL_SECONDS = 24 * 3600
+
+# LAMA (DETIK) ISI FILE YANG BARU DI-UPLOAD DIPAKAI LANGSUNG TANPA FETCH ULANG
+RAW_PIN_SECONDS = 300
+
+# SNAPSHOT CONFIG DIPAKAI BERSAMA SEMUA SESI SELAMA TTL INI
+CONFIG_TTL_SECONDS = 10
+
+# DATA USER YANG SUDAH DIBACA DIPAKAI ULANG SELAMA TTL INI
+USER_CACHE_TTL = 60
+
+# PROGRES DASHBOARD: SINKRON DENGAN MANIFEST / BANGUN ULANG DARI MASTER (DETIK)
+PROGRESS_SYNC_SECONDS = 30
+PROGRESS_REBUILD_SECONDS = 600
+
+# HIT LOGIN DITAMPUNG DI MEMORI, DITULIS KE SHARD HARIAN TIAP INTERVAL INI
+LOG_FLUSH_SECONDS = 30
+# COMPACT SHARD LOG LAMA (DI THREAD FLUSH, SATU PROSES SEKALIGUS LEWAT LEASE) & CACHE TAMPILAN MONITORING (DETIK)
+LOG_COMPACT_SECONDS = 3600
+LOG_COMPACT_LEASE_SECONDS = 600
+LOG_VIEW_TTL_SECONDS = 60
 
 def get_now_wita():
     return datetime.utcnow() + timedelta(hours=8)
@@ -54,121 +153,1343 @@ def get_indonesia_date():
     now = get_now_wita()
     return f"{now.day}_{bulan[now.month-1]}_{now.year}"
 
-def load_json_db(path):
-    try:
-        url = f"https://res.cloudinary.com/{st.secrets['cloud_name']}/raw/upload/v{int(time.time())}/{path}"
-        resp = requests.get(url, timeout=10)
-        return resp.json() if resp.status_code == 200 else {}
-    except: return {}
+# --- HTTP CLIENT BERSAMA: KEEP-ALIVE, RETRY + BACKOFF, BATAS WAKTU & BATAS REQUEST BERSAMAAN ---
+class StorageError(Exception):
+    # STORAGE GAGAL DIHUBUNGI / ERROR -> JANGAN DIANGGAP DATA KOSONG
+    pass
 
-def save_json_db(path, db_dict):
-    try:
-        json_data = json.dumps(db_dict)
-        cloudinary.uploader.upload(io.BytesIO(json_data.encode()), resource_type="raw", public_id=path, overwrite=True, invalidate=True)
+def is_transient(e):
+    return isinstance(e, (requests.ConnectionError, requests.Timeout, requests.HTTPError, cloudinary.exceptions.RateLimited, cloudinary.exceptions.GeneralError, OSError))
+
+class HttpClient:
+    def __init__(self, max_inflight, retries):
+        self.session = requests.Session()
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max_inflight))
+        self.slots = threading.BoundedSemaphore(max_inflight)
+        self.retries = retries
+
+    def call(self, fn, budget):
+        # fn(sisa_waktu) DIULANG MAKS self.retries KALI (BACKOFF + JITTER), TOTAL TIDAK LEBIH DARI budget DETIK
+        deadline = time.monotonic() + budget
+        for attempt in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.slots.acquire(timeout=remaining): raise StorageError(f"Batas waktu {budget}s habis")
+            try: return fn(deadline - time.monotonic())
+            except Exception as e:
+                if not is_transient(e): raise
+                if attempt == self.retries or time.monotonic() >= deadline: raise StorageError(f"Gagal setelah {attempt + 1}x percobaan: {e}") from e
+            finally: self.slots.release()
+            time.sleep(min(random.uniform(0, HTTP_BACKOFF_SECONDS * 2 ** attempt), max(deadline - time.monotonic(), 0)))
+
+    def get(self, url, headers=None, budget=10, stream=False):
+        def attempt(remaining):
+            resp = self.session.get(url, headers=headers, timeout=max(remaining, 0.1), stream=stream)
+            # 429 / 5xx DICOBA ULANG, STATUS LAIN DIKEMBALIKAN KE PEMANGGIL
+            if resp.status_code == 429 or resp.status_code >= 500: resp.raise_for_status()
+            return resp
+        return self.call(attempt, budget)
+
+def with_script_ctx(fn):
+    # FUNGSI YANG JALAN DI THREAD POOL IKUT MEMAKAI CONTEXT SESI (cache_resource, secrets, st.*)
+    ctx = get_script_run_ctx()
+    def run(*args, **kwargs):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args, **kwargs)
+    return run
+
+@st.cache_resource
+def get_http_client():
+    return HttpClient(HTTP_MAX_INFLIGHT, HTTP_RETRIES)
+
+# --- METRIK: LATENCY, UKURAN & ERROR PER OPERASI (STORAGE, PARSE, RENDER HALAMAN) ---
+class Metrics:
+    def __init__(self, textfile=None):
+        self.lock = threading.Lock()
+        self.ops = {}
+        self.textfile = textfile
+        if textfile:
+            threading.Thread(target=self.run, daemon=True).start()
+            atexit.register(self.write_textfile)
+
+    def observe(self, op, seconds, nbytes=0, error=False):
+        with self.lock:
+            m = self.ops.get(op)
+            if m is None: m = self.ops[op] = {"count": 0, "errors": 0, "sum": 0.0, "bytes": 0, "buckets": [0] * (len(LATENCY_BUCKETS) + 1)}
+            m["count"] += 1; m["errors"] += bool(error); m["sum"] += seconds; m["bytes"] += nbytes
+            m["buckets"][next((i for i, b in enumerate(LATENCY_BUCKETS) if seconds <= b), len(LATENCY_BUCKETS))] += 1
+
+    def snapshot(self):
+        with self.lock: return {op: {**m, "buckets": list(m["buckets"])} for op, m in self.ops.items()}
+
+    def table(self):
+        def pct(m, q):
+            # PERKIRAAN PERSENTIL = BATAS ATAS BUCKET HISTOGRAM
+            seen = 0
+            for i, n in enumerate(m["buckets"]):
+                seen += n
+                if seen >= q * m["count"]: return LATENCY_BUCKETS[i] * 1000 if i < len(LATENCY_BUCKETS) else np.inf
+        rows = [{"Operasi": op, "Jumlah": m["count"], "Error": m["errors"], "Rata2 (ms)": m["sum"] / m["count"] * 1000,
+                 "p50 (ms) ≤": pct(m, 0.5), "p95 (ms) ≤": pct(m, 0.95), "Total (s)": m["sum"], "Data (MB)": m["bytes"] / 1e6}
+                for op, m in self.snapshot().items() if m["count"]]
+        return pd.DataFrame(rows, columns=["Operasi", "Jumlah", "Error", "Rata2 (ms)", "p50 (ms) ≤", "p95 (ms) ≤", "Total (s)", "Data (MB)"]).sort_values("Total (s)", ascending=False)
+
+    def prometheus(self):
+        name = "so_rawan_hilang_op"
+        lines = [f"# HELP {name}_duration_seconds Durasi operasi (storage, parse, render halaman).", f"# TYPE {name}_duration_seconds histogram"]
+        snap = sorted(self.snapshot().items())
+        for op, m in snap:
+            seen = 0
+            for b, n in zip(LATENCY_BUCKETS, m["buckets"]):
+                seen += n; lines.append(f'{name}_duration_seconds_bucket{{op="{op}",le="{b}"}} {seen}')
+            lines.append(f'{name}_duration_seconds_bucket{{op="{op}",le="+Inf"}} {m["count"]}')
+            lines.append(f'{name}_duration_seconds_sum{{op="{op}"}} {m["sum"]:.6f}')
+            lines.append(f'{name}_duration_seconds_count{{op="{op}"}} {m["count"]}')
+        lines += [f"# HELP {name}_errors_total Jumlah operasi yang gagal.", f"# TYPE {name}_errors_total counter"]
+        lines += [f'{name}_errors_total{{op="{op}"}} {m["errors"]}' for op, m in snap]
+        lines += [f"# HELP {name}_bytes_total Total byte yang dibaca / ditulis.", f"# TYPE {name}_bytes_total counter"]
+        lines += [f'{name}_bytes_total{{op="{op}"}} {m["bytes"]}' for op, m in snap]
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self):
+        # UNTUK TEXTFILE COLLECTOR node_exporter: TULIS KE .tmp LALU RENAME
+        tmp = f"{self.textfile}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f: f.write(self.prometheus())
+        os.replace(tmp, self.textfile)
+
+    def run(self):
+        while True:
+            time.sleep(METRICS_FLUSH_SECONDS)
+            try: self.write_textfile()
+            except: pass
+
+@st.cache_resource
+def get_metrics():
+    return Metrics(get_secret("metrics_textfile"))
+
+@contextmanager
+def track(op, nbytes=0):
+    # PAKAI: with track("parse.master") as t: ... ; t["bytes"] = ukuran data (opsional)
+    t = {"bytes": nbytes}
+    t0, error = time.perf_counter(), False
+    try: yield t
+    except Exception:
+        error = True; raise
+    finally: get_metrics().observe(op, time.perf_counter() - t0, t["bytes"], error)
+
+class TrackedStorage:
+    # SEMUA CALL STORAGE LEWAT SINI: TERCATAT SEBAGAI storage.{op}, ERROR APA PUN DARI BACKEND JADI StorageError
+    def __init__(self, backend):
+        self.backend = backend
+
+    def call(self, op, fn, *args, nbytes=0, **kwargs):
+        with track(f"storage.{op}", nbytes) as t:
+            try: result = fn(*args, **kwargs)
+            except StorageError: raise
+            except Exception as e: raise StorageError(f"storage.{op} gagal: {e}") from e
+            if op == "get": t["bytes"] = len(result or b"")
+            if op == "get_file" and result: t["bytes"] = os.path.getsize(args[2])
+        return result
+
+    def get(self, path, version=None, timeout=10):
+        return self.call("get", self.backend.get, path, version=version, timeout=timeout)
+
+    def put(self, path, content):
+        return self.call("put", self.backend.put, path, content, nbytes=len(content))
+
+    def put_file(self, path, file_path):
+        return self.call("put_file", self.backend.put_file, path, file_path, nbytes=os.path.getsize(file_path))
+
+    def get_file(self, path, version, dest):
+        return self.call("get_file", self.backend.get_file, path, version, dest)
+
+    def list(self, prefix):
+        return self.call("list", lambda: list(self.backend.list(prefix)))
+
+    def version(self, path):
+        return self.call("version", self.backend.version, path)
+
+    def rename(self, src, dst):
+        return self.call("rename", self.backend.rename, src, dst)
+
+    def delete(self, paths):
+        return self.call("delete", self.backend.delete, paths)
+
+    def delete_prefix(self, prefix):
+        return self.call("delete_prefix", self.backend.delete_prefix, prefix)
+
+    def folders(self, path):
+        return self.call("folders", self.backend.folders, path)
+
+    def delete_folder(self, path):
+        return self.call("delete_folder", self.backend.delete_folder, path)
+
+    def forget(self, prefix=""):
+        self.backend.forget(prefix)
+
+# --- CACHE BLOB PER (PATH, VERSI): RAM (LRU) + DISK, DIPAKAI BERSAMA SEMUA SESI DI PROSES ---
+class BlobCache:
+    # TIAP PATH HANYA MENYIMPAN VERSI TERAKHIR; FILE DISK BERTAHAN WALAU APP RESTART
+    def __init__(self, mem_bytes, disk_bytes, disk_dir):
+        self.mem_bytes, self.disk_bytes, self.disk_dir = mem_bytes, disk_bytes, disk_dir
+        self.lock = threading.Lock()
+        self.mem, self.mem_used = OrderedDict(), 0
+        self.disk, self.disk_used = OrderedDict(), 0
+        self.stats = {"hit_mem": 0, "hit_disk": 0, "miss": 0, "evict_mem": 0, "evict_disk": 0}
+        os.makedirs(disk_dir, exist_ok=True)
+        files = []
+        for name in os.listdir(disk_dir):
+            try: info = os.stat(os.path.join(disk_dir, name))
+            except FileNotFoundError: continue
+            if name.endswith(".blob"): files.append((info.st_mtime, name, info.st_size))
+        for _, name, size in sorted(files):
+            self.disk[name] = size; self.disk_used += size
+
+    def file_name(self, path, version):
+        return f"{hashlib.sha1(path.encode()).hexdigest()}_{hashlib.sha1(str(version).encode()).hexdigest()[:16]}.blob"
+
+    def get(self, path, version):
+        with self.lock:
+            hit = self.mem.get(path)
+            if hit and hit[0] == version:
+                self.mem.move_to_end(path); self.stats["hit_mem"] += 1
+                return hit[1]
+        name = self.file_name(path, version)
+        try:
+            with open(os.path.join(self.disk_dir, name), "rb") as f: content = f.read()
+            os.utime(os.path.join(self.disk_dir, name))
+        except FileNotFoundError:
+            with self.lock: self.stats["miss"] += 1; self.disk.pop(name, None)
+            return None
+        with self.lock:
+            self.stats["hit_disk"] += 1
+            if name in self.disk: self.disk.move_to_end(name)
+        self.put_mem(path, version, content)
+        return content
+
+    def put(self, path, version, content):
+        self.put_mem(path, version, content)
+        name = self.file_name(path, version)
+        prefix = name.split("_")[0] + "_"
+        tmp = os.path.join(self.disk_dir, f"{name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp, "wb") as f: f.write(content)
+            os.replace(tmp, os.path.join(self.disk_dir, name))
+        except OSError: return
+        with self.lock:
+            # VERSI LAMA PATH YANG SAMA LANGSUNG DIBUANG, SISANYA LRU SAMPAI MUAT BUDGET DISK
+            stale = [n for n in self.disk if n.startswith(prefix) and n != name]
+            for n in stale: self.disk_used -= self.disk.pop(n)
+            self.disk_used += len(content) - self.disk.pop(name, 0)
+            self.disk[name] = len(content)
+            while self.disk_used > self.disk_bytes and len(self.disk) > 1:
+                old, size = self.disk.popitem(last=False); self.disk_used -= size; self.stats["evict_disk"] += 1
+                stale.append(old)
+        for n in stale:
+            try: os.remove(os.path.join(self.disk_dir, n))
+            except FileNotFoundError: pass
+
+    def put_mem(self, path, version, content):
+        # FILE LEBIH BESAR DARI 1/4 BUDGET RAM HANYA DISIMPAN DI DISK
+        if len(content) > self.mem_bytes // 4: return
+        with self.lock:
+            old = self.mem.pop(path, None)
+            if old: self.mem_used -= len(old[1])
+            self.mem[path] = (version, content); self.mem_used += len(content)
+            while self.mem_used > self.mem_bytes:
+                _, (_, old_content) = self.mem.popitem(last=False); self.mem_used -= len(old_content); self.stats["evict_mem"] += 1
+
+    def summary(self):
+        with self.lock:
+            return {**self.stats, "mem_items": len(self.mem), "mem_mb": self.mem_used / 1e6, "disk_items": len(self.disk), "disk_mb": self.disk_used / 1e6}
+
+@st.cache_resource
+def get_blob_cache():
+    return BlobCache(BLOB_MEM_BYTES, BLOB_DISK_BYTES, get_secret("blob_cache_dir", BLOB_DISK_DIR))
+
+# --- STORAGE: CLOUDINARY (DEFAULT) ATAU FOLDER LOKAL (secrets storage_backend = "local") ---
+class CloudinaryStorage:
+    # FETCH DENGAN ETAG (304 = PAKAI BYTES YANG SUDAH ADA), FILE YANG BARU DI-UPLOAD DI-PIN SELAMA CDN INVALIDASI
+    # ISI FILE DISIMPAN DI BLOB CACHE: PATH BERVERSI PER VERSI, PATH TANPA VERSI PER ETAG
+    def __init__(self, cloud_name, blobs, http):
+        self.cloud_name = cloud_name
+        self.blobs = blobs
+        self.http = http
+        self.cache = {}
+
+    def api(self, fn, *args, **kwargs):
+        return self.http.call(lambda remaining: fn(*args, **kwargs), API_BUDGET_SECONDS)
+
+    def url(self, path, version=None):
+        return f"https://res.cloudinary.com/{self.cloud_name}/raw/upload/{f'v{version}/' if version else ''}{path}"
+
+    def get(self, path, version=None, timeout=10):
+        if version:
+            # URL BERVERSI TIDAK PERNAH BERUBAH ISINYA -> CUKUP SEKALI DOWNLOAD
+            content = self.blobs.get(path, version)
+            if content is not None: return content
+            resp = self.http.get(self.url(path, version), budget=timeout)
+            if resp.status_code == 404: return None
+            if resp.status_code != 200: raise StorageError(f"HTTP {resp.status_code} untuk {path}")
+            self.blobs.put(path, version, resp.content)
+            return resp.content
+        entry = self.cache.get(path)
+        content = self.blobs.get(path, entry["key"]) if entry else None
+        if content is not None and entry.get("pinned_at") and time.time() - entry["pinned_at"] < RAW_PIN_SECONDS:
+            return content
+        headers = {}
+        if content is not None and entry.get("etag"): headers["If-None-Match"] = entry["etag"]
+        if content is not None and entry.get("modified"): headers["If-Modified-Since"] = entry["modified"]
+        resp = self.http.get(self.url(path), headers=headers, budget=timeout)
+        if resp.status_code == 304 and content is not None:
+            return content
+        if resp.status_code == 200:
+            etag = resp.headers.get("ETag")
+            self.cache[path] = {"key": etag or f"t{time.time_ns()}", "etag": etag, "modified": resp.headers.get("Last-Modified")}
+            self.blobs.put(path, self.cache[path]["key"], resp.content)
+            return resp.content
+        self.cache.pop(path, None)
+        if resp.status_code == 404: return None
+        raise StorageError(f"HTTP {resp.status_code} untuk {path}")
+
+    def put(self, path, content):
+        res = self.http.call(lambda remaining: cloudinary.uploader.upload(io.BytesIO(content), resource_type="raw", public_id=path, overwrite=True, invalidate=True), API_BUDGET_SECONDS)
+        self.cache[path] = {"key": res.get("version"), "pinned_at": time.time()}
+        self.blobs.put(path, res.get("version"), content)
+        return res.get("version")
+
+    def put_file(self, path, file_path):
+        # FILE BESAR (FILE REKAP): DI-UPLOAD PER CHUNK LANGSUNG DARI DISK, TIDAK MASUK RAM / BLOB CACHE
+        res = self.http.call(lambda remaining: cloudinary.uploader.upload_large(file_path, resource_type="raw", public_id=path, overwrite=True, invalidate=True), API_BUDGET_SECONDS)
+        self.cache.pop(path, None)
+        return res.get("version")
+
+    def get_file(self, path, version, dest):
+        # DOWNLOAD DI-STREAM KE FILE, TANPA BLOB CACHE; False = FILE TIDAK ADA
+        resp = self.http.get(self.url(path, version), budget=API_BUDGET_SECONDS, stream=True)
+        if resp.status_code == 404: return False
+        if resp.status_code != 200: raise StorageError(f"HTTP {resp.status_code} untuk {path}")
+        tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            for chunk in resp.iter_content(1024 * 1024): f.write(chunk)
+        os.replace(tmp, dest)
+        return True
+
+    def list(self, prefix):
+        next_cursor = None
+        while True:
+            res = self.api(cloudinary.api.resources, resource_type="raw", type="upload", prefix=prefix, max_results=500, next_cursor=next_cursor)
+            for r in res.get("resources", []): yield {"public_id": r["public_id"], "version": r.get("version"), "created_at": r.get("created_at")}
+            next_cursor = res.get("next_cursor")
+            if not next_cursor: break
+
+    def version(self, path):
+        try: return self.api(cloudinary.api.resource, path, resource_type="raw").get("version")
+        except cloudinary.exceptions.NotFound: return None
+
+    def rename(self, src, dst):
+        self.api(cloudinary.uploader.rename, src, dst, resource_type="raw", overwrite=True, invalidate=True)
+        self.forget(src); self.forget(dst)
+
+    def delete(self, paths):
+        # MAKS 100 PUBLIC_ID PER CALL delete_resources
+        deleted = 0
+        for i in range(0, len(paths), DELETE_BATCH_SIZE):
+            res = self.api(cloudinary.api.delete_resources, paths[i:i + DELETE_BATCH_SIZE], resource_type="raw")
+            deleted += sum(1 for v in res.get("deleted", {}).values() if v == "deleted")
+        for path in paths: self.cache.pop(path, None)
+        return deleted
+
+    def delete_prefix(self, prefix):
+        deleted = 0
+        while True:
+            res = self.api(cloudinary.api.delete_resources_by_prefix, prefix, resource_type="raw")
+            deleted += sum(1 for v in res.get("deleted", {}).values() if v == "deleted")
+            if not res.get("partial"): break
+        self.forget(prefix)
+        return deleted
+
+    def folders(self, path):
+        # NAMA SUBFOLDER LANGSUNG DI BAWAH path (Admin API subfolders), TANPA LISTING SEMUA FILE DI DALAMNYA
+        names, next_cursor = [], None
+        while True:
+            try: res = self.api(cloudinary.api.subfolders, path, max_results=500, next_cursor=next_cursor)
+            except cloudinary.exceptions.NotFound: return names
+            names += [f["name"] for f in res.get("folders", [])]
+            next_cursor = res.get("next_cursor")
+            if not next_cursor: return names
+
+    def delete_folder(self, path):
+        # FOLDER KOSONG SISA delete_prefix (SUBFOLDER DULU) SUPAYA TIDAK MUNCUL LAGI DI folders()
+        for name in self.folders(path): self.delete_folder(f"{path}/{name}")
+        try: self.api(cloudinary.api.delete_folder, path)
+        except cloudinary.exceptions.NotFound: pass
+
+    def forget(self, prefix=""):
+        for path in [p for p in list(self.cache) if p.startswith(prefix)]: self.cache.pop(path, None)
+
+class LocalStorage:
+    # FILE DI FOLDER LOKAL / NAS, VERSI = mtime (ns) FILE. HANYA VERSI TERAKHIR YANG DISIMPAN
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def file(self, path):
+        full = os.path.abspath(os.path.join(self.root, path))
+        if not full.startswith(self.root + os.sep): raise ValueError(f"Path di luar storage: {path}")
+        return full
+
+    def get(self, path, version=None, timeout=None):
+        try:
+            with open(self.file(path), "rb") as f: return f.read()
+        except FileNotFoundError: return None
+
+    def put(self, path, content):
+        return self.write(path, lambda f: f.write(content))
+
+    def put_file(self, path, file_path):
+        with open(file_path, "rb") as src: return self.write(path, lambda f: shutil.copyfileobj(src, f))
+
+    def get_file(self, path, version, dest):
+        try: shutil.copyfile(self.file(path), dest)
+        except FileNotFoundError: return False
         return True
-    except: return False
+
+    def write(self, path, fill):
+        full = self.file(path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        tmp = f"{full}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f: fill(f)
+        # VERSI HARUS NAIK DI SETIAP PUT WALAU mtime FILESYSTEM KASAR
+        with self.lock:
+            version = max(time.time_ns(), (self.version(path) or 0) + 1)
+            os.utime(tmp, ns=(version, version))
+            os.replace(tmp, full)
+        return version
+
+    def list(self, prefix):
+        start = self.file(prefix.rsplit("/", 1)[0]) if "/" in prefix else self.root
+        found = []
+        for folder, _, names in os.walk(start):
+            for name in names:
+                full = os.path.join(folder, name)
+                path = os.path.relpath(full, self.root).replace(os.sep, "/")
+                if path.startswith(prefix) and not name.endswith(".tmp"): found.append((path, full))
+        for path, full in sorted(found):
+            try: mtime = os.stat(full).st_mtime_ns
+            except FileNotFoundError: continue
+            yield {"public_id": path, "version": mtime, "created_at": datetime.utcfromtimestamp(mtime / 1e9).strftime("%Y-%m-%dT%H:%M:%SZ")}
+
+    def version(self, path):
+        try: return os.stat(self.file(path)).st_mtime_ns
+        except FileNotFoundError: return None
+
+    def rename(self, src, dst):
+        full = self.file(dst)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        os.replace(self.file(src), full)
+
+    def delete(self, paths):
+        deleted = 0
+        for path in paths:
+            try: os.remove(self.file(path)); deleted += 1
+            except FileNotFoundError: pass
+        return deleted
+
+    def delete_prefix(self, prefix):
+        return self.delete([r["public_id"] for r in self.list(prefix)])
+
+    def folders(self, path):
+        try: full = self.file(path); return sorted(n for n in os.listdir(full) if os.path.isdir(os.path.join(full, n)))
+        except FileNotFoundError: return []
+
+    def delete_folder(self, path):
+        # HANYA FOLDER KOSONG, DARI YANG PALING DALAM
+        for folder, _, _ in os.walk(self.file(path), topdown=False):
+            try: os.rmdir(folder)
+            except OSError: pass
+
+    def forget(self, prefix=""):
+        pass
+
+@st.cache_resource
+def get_storage():
+    if STORAGE_BACKEND == "local": return TrackedStorage(LocalStorage(get_secret("storage_root", "so_rawan_hilang_data")))
+    return TrackedStorage(CloudinaryStorage(st.secrets["cloud_name"], get_blob_cache(), get_http_client()))
+
+def load_json_db(path, version=None):
+    # FILE BELUM ADA = {}. STORAGE GAGAL / JSON RUSAK -> StorageError, BUKAN {} (BISA TERBACA "TIDAK ADA USER")
+    content = get_storage().get(path, version=version)
+    if not content: return {}
+    try: return json.loads(content)
+    except ValueError as e: raise StorageError(f"{path} rusak: {e}") from e
+
+def load_json_latest(path):
+    # UNTUK BACA -> UBAH -> TULIS ULANG: VERSI TERBARU DITANYA KE SERVER, LALU DIBACA LEWAT URL BERVERSI
+    # (BUKAN SALINAN PIN / CDN YANG BISA MASIH LAMA -> UPDATE PROSES LAIN TERTIMPA)
+    version = get_storage().version(path)
+    return {} if version is None else load_json_db(path, version)
+
+def save_json_db(path, db_dict):
+    get_storage().put(path, json.dumps(db_dict).encode())
+    if path == CONFIG_PATH: set_config_snapshot(db_dict)
+    return True
+
+# --- SNAPSHOT CONFIG (SATU FETCH UNTUK SEMUA SESI SELAMA TTL) ---
+@st.cache_resource
+def get_config_snapshot():
+    return {"config": None, "loaded_at": 0.0, "lock": threading.Lock()}
+
+def set_config_snapshot(config):
+    snap = get_config_snapshot()
+    snap["config"], snap["loaded_at"] = dict(config), time.time()
+
+def load_config(fresh=False):
+    snap = get_config_snapshot()
+    with snap["lock"]:
+        if fresh or snap["config"] is None or time.time() - snap["loaded_at"] > CONFIG_TTL_SECONDS:
+            try: set_config_snapshot(load_json_latest(CONFIG_PATH) if fresh else load_json_db(CONFIG_PATH))
+            except StorageError:
+                # SNAPSHOT LAMA TETAP DIPAKAI SAMPAI TTL BERIKUTNYA; BELUM ADA SNAPSHOT / BUTUH DATA TERBARU -> ERROR
+                if fresh or snap["config"] is None: raise
+                snap["loaded_at"] = time.time()
+        return dict(snap["config"])
+
+# --- USER: SATU FILE PER NIK (users/{nik}.json) ---
+@st.cache_resource
+def get_user_cache():
+    return {}
+
+def user_path(nik):
+    return f"{USER_DIR}/{nik}.json"
+
+def get_user(nik):
+    nik = str(nik).strip()
+    if not nik.isalnum(): return None
+    cache = get_user_cache()
+    hit = cache.get(nik)
+    if hit and time.time() - hit[1] < USER_CACHE_TTL: return hit[0]
+    user = load_json_db(user_path(nik)) or None
+    if user is None and not load_config().get("users_sharded"):
+        # BELUM DIMIGRASI: CARI DI users.json LAMA LALU PINDAHKAN KE FILE PER NIK
+        pw = load_json_db(USER_DB_PATH).get(nik)
+        if pw is not None:
+            user = {"pw": pw}
+            try: save_json_db(user_path(nik), user)
+            except StorageError: pass
+    if user is not None: cache[nik] = (user, time.time())
+    return user
+
+def save_user(nik, pw):
+    nik = str(nik).strip()
+    if not nik.isalnum(): return False
+    user = {"pw": pw}
+    try: save_json_db(user_path(nik), user)
+    except StorageError: return False
+    get_user_cache()[nik] = (user, time.time())
+    return True
+
+def migrate_users():
+    db = load_json_db(USER_DB_PATH)
+    with ThreadPoolExecutor(8) as pool: results = list(pool.map(lambda item: save_user(*item), db.items()))
+    if all(results):
+        config = load_config(fresh=True); config["users_sharded"] = True; save_json_db(CONFIG_PATH, config)
+    return sum(results), len(db)
+
+# --- ACCESS LOG: BUFFER DI PROSES, SHARD access_logs/{tanggal}/{instance}.json ---
+class AccessLogBuffer:
+    # TIAP PROSES HANYA MENULIS SHARD MILIKNYA SENDIRI -> TIDAK ADA HIT YANG SALING TIMPA
+    def __init__(self):
+        self.instance = uuid.uuid4().hex[:12]
+        self.lock = threading.Lock()
+        self.totals, self.dirty = {}, set()
+        threading.Thread(target=self.run, daemon=True).start()
+        atexit.register(self.flush)
+
+    def hit(self, nik, day):
+        with self.lock:
+            day_hits = self.totals.setdefault(day, {})
+            day_hits[nik] = day_hits.get(nik, 0) + 1
+            self.dirty.add(day)
+
+    def shard_path(self, day):
+        return f"{LOG_DIR}/{day}/{self.instance}.json"
+
+    def snapshot(self):
+        with self.lock: return {day: dict(hits) for day, hits in self.totals.items()}
+
+    def flush(self):
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+            pending = {day: dict(self.totals[day]) for day in dirty}
+        for day, hits in pending.items():
+            try: save_json_db(self.shard_path(day), hits)
+            except StorageError:
+                with self.lock: self.dirty.add(day)
+        with self.lock:
+            today = get_session_date()
+            for day in [d for d in self.totals if d < today and d not in self.dirty]: self.totals.pop(day)
+
+    def run(self):
+        last_compact = 0.0
+        while True:
+            time.sleep(LOG_FLUSH_SECONDS)
+            try: self.flush()
+            except: pass
+            if time.time() - last_compact >= LOG_COMPACT_SECONDS:
+                last_compact = time.time()
+                try: compact_access_logs(self.instance)
+                except: pass
+
+@st.cache_resource
+def get_access_log():
+    return AccessLogBuffer()
 
 def record_login_hit(nik):
-    db_logs = load_json_db(LOG_DB_PATH)
-    today = get_session_date()
-    if nik not in db_logs: db_logs[nik] = {}
-    db_logs[nik][today] = db_logs[nik].get(today, 0) + 1
-    save_json_db(LOG_DB_PATH, db_logs)
+    get_access_log().hit(nik, get_session_date())
+
+def compact_access_logs(owner):
+    # SHARD HARI < KEMARIN DIGABUNG JADI 1 FILE PER HARI LALU DIHAPUS. DIJALANKAN THREAD FLUSH, BUKAN SAAT RENDER;
+    # LEASE DI STORAGE -> HANYA SATU PROSES YANG COMPACT. NAMA SHARD DICATAT -> SHARD YANG SUDAH MASUK TIDAK DIHITUNG DUA KALI
+    lease = load_json_latest(LOG_COMPACT_LOCK_PATH)
+    if lease.get("owner") not in (None, owner) and lease.get("until", 0) > time.time(): return
+    save_json_db(LOG_COMPACT_LOCK_PATH, {"owner": owner, "until": time.time() + LOG_COMPACT_LEASE_SECONDS})
+    if load_json_latest(LOG_COMPACT_LOCK_PATH).get("owner") != owner: return
+    try:
+        cutoff = (get_now_wita() - timedelta(days=1)).strftime('%Y-%m-%d')
+        by_day = {}
+        for r in list_resources(f"{LOG_DIR}/"): by_day.setdefault(r["public_id"].split("/")[-2], []).append(r)
+        for day, shards in by_day.items():
+            if day >= cutoff: continue
+            day_db = load_json_latest(f"{LOG_DAY_DIR}/{day}.json") or {"hits": {}, "shards": []}
+            done = []
+            for r in shards:
+                name = r["public_id"].rsplit("/", 1)[-1]
+                if name not in day_db["shards"]:
+                    content = get_storage().get(r["public_id"], version=r.get("version"))
+                    # SHARD SUDAH TERHAPUS -> DILEWATI, TIDAK DICATAT (ISINYA SUDAH ADA DI FILE HARIAN)
+                    if content is None: continue
+                    for nik, n in json.loads(content).items(): day_db["hits"][nik] = day_db["hits"].get(nik, 0) + n
+                    day_db["shards"].append(name)
+                done.append(r["public_id"])
+            save_json_db(f"{LOG_DAY_DIR}/{day}.json", day_db)
+            get_storage().delete(done)
+    finally:
+        save_json_db(LOG_COMPACT_LOCK_PATH, {"owner": None, "until": 0})
+
+@st.cache_resource
+def get_access_log_view():
+    return {"lock": threading.Lock(), "logs": None, "loaded_at": 0.0}
+
+def load_access_logs():
+    # TAB MONITORING IKUT DI-RENDER DI SETIAP RERUN HALAMAN ADMIN -> HASIL DIPAKAI ULANG SELAMA LOG_VIEW_TTL_SECONDS
+    view = get_access_log_view()
+    with view["lock"]:
+        if view["logs"] is None or time.time() - view["loaded_at"] > LOG_VIEW_TTL_SECONDS: view["logs"], view["loaded_at"] = read_access_logs(), time.time()
+        return view["logs"]
+
+def read_access_logs():
+    # GABUNG: LOG LAMA (SATU FILE) + FILE HARIAN (HASIL COMPACT) + SHARD YANG BELUM DI-COMPACT + HIT YANG BELUM DI-FLUSH
+    buffer = get_access_log()
+    merged = {}
+    def add(day, hits):
+        for nik, n in hits.items():
+            merged.setdefault(nik, {})
+            merged[nik][day] = merged[nik].get(day, 0) + n
+    for nik, days in load_json_db(LOG_DB_PATH).items():
+        for day, n in days.items(): add(day, {nik: n})
+    # FILE HARIAN DIBACA PER VERSI -> RERUN BERIKUTNYA DARI BLOB CACHE, BUKAN DOWNLOAD ULANG
+    days, compacted = list_resources(f"{LOG_DAY_DIR}/"), set()
+    with ThreadPoolExecutor(8) as pool:
+        for r, day_db in zip(days, pool.map(with_script_ctx(lambda r: load_json_db(r["public_id"], r.get("version"))), days)):
+            day = r["public_id"].rsplit("/", 1)[-1][:-len(".json")]
+            add(day, day_db.get("hits", {}))
+            compacted.update(f"{LOG_DIR}/{day}/{name}" for name in day_db.get("shards", []))
+    # SHARD MILIK PROSES INI DILEWATI HANYA UNTUK HARI YANG MASIH ADA DI BUFFER (SUDAH TERHITUNG LEWAT snapshot);
+    # SHARD YANG SUDAH TERCATAT DI FILE HARIAN (COMPACT BERJALAN BERSAMAAN) JUGA DILEWATI
+    pending = buffer.snapshot()
+    shards = [r["public_id"] for r in list_resources(f"{LOG_DIR}/") if r["public_id"] not in compacted and not (r["public_id"].endswith(f"/{buffer.instance}.json") and r["public_id"].split("/")[-2] in pending)]
+    with ThreadPoolExecutor(8) as pool:
+        for path, hits in zip(shards, pool.map(with_script_ctx(load_json_db), shards)): add(path.split("/")[-2], hits)
+    for day, hits in pending.items(): add(day, hits)
+    return merged
 
 # --- FUNGSI MAINTENANCE ---
 def is_maintenance_mode():
-    config = load_json_db(CONFIG_PATH)
+    config = load_config()
     return config.get("maintenance_mode", False)
 
 def set_maintenance_mode(status: bool):
-    config = load_json_db(CONFIG_PATH)
+    config = load_config(fresh=True)
     config["maintenance_mode"] = status
     save_json_db(CONFIG_PATH, config)
 
 def get_active_project_id():
-    config = load_json_db(CONFIG_PATH)
+    config = load_config()
     return str(config.get("active_id", "BELUM_ADA_MASTER_AKTIF"))
 
 # =================================================================
 # 3. FUNGSI OLAH DATA (SINKRONISASI & PAGINATION)
 # =================================================================
 
-@st.cache_data(ttl=60)
-def get_master_info():
+def norm_key(series):
+    return series.astype(str).str.strip()
+
+def norm_code(series):
+    return norm_key(series).str.upper()
+
+class MasterData:
+    # MASTER + INDEX KODE TOKO -> POSISI BARIS (SLICE KALAU BARISNYA BERURUTAN); version = HASH ISI FILE MASTER
+    def __init__(self, df, version=None):
+        self.df, self.version = df, version
+        self.row_codes = norm_code(df[df.columns[0]])
+        self.store_index, self.dir_df = {}, None
+        for code, pos in self.row_codes.groupby(self.row_codes.values, sort=False).indices.items():
+            self.store_index[code] = slice(int(pos[0]), int(pos[-1]) + 1) if pos[-1] - pos[0] + 1 == len(pos) else pos
+
+    def store(self, code):
+        idx = self.store_index.get(str(code).strip().upper())
+        return self.df.iloc[0:0] if idx is None else self.df.iloc[idx]
+
+    def directory(self):
+        # 1 BARIS PER TOKO, INDEX = KODE TERNORMALISASI (SAMA DENGAN DIRECTORY DARI SHARD); DIBUAT SEKALI
+        if self.dir_df is not None: return self.dir_df
+        first = [idx.start if isinstance(idx, slice) else idx[0] for idx in self.store_index.values()]
+        df_dir = self.df.iloc[first, [0, 1, 2, 3]].copy()
+        df_dir.columns = ["Kode", "Nama", "AM", "AS"]
+        df_dir.index = pd.Index(list(self.store_index), name="Kode Norm")
+        self.dir_df = df_dir
+        return df_dir
+
+def normalize_frame(df):
+    # NAMA KOLOM DI-STRIP, KOLOM CAMPURAN (ANGKA + TEKS) JADI TEKS SUPAYA BISA DISIMPAN KE PARQUET
+    df.columns = [str(c).strip() for c in df.columns]
+    for c in df.columns:
+        if pd.api.types.infer_dtype(df[c], skipna=True).startswith("mixed"):
+            df[c] = df[c].where(df[c].isna(), df[c].astype(str))
+    return df
+
+def compile_master(content):
+    with track("parse.master_xlsx", len(content)): df = normalize_frame(pd.read_excel(io.BytesIO(content)))
+    buf = io.BytesIO(); df.to_parquet(buf, index=False)
+    return buf.getvalue()
+
+def master_shard_path(shard_id, code): return f"{MASTER_SHARD_DIR}/{shard_id}/{code}.parquet"
+def master_directory_path(shard_id): return f"{MASTER_SHARD_DIR}/{shard_id}/_directory.parquet"
+
+def write_master_shards(master):
+    # 1 PARQUET PER TOKO + DIRECTORY (Kode, Nama, AM, AS, VERSI SHARD) -> USER_INPUT & DASHBOARD TIDAK BACA MASTER PENUH
+    storage, shard_id = get_storage(), str(time.time_ns())
+    directory = master.directory().copy()
+    put = with_script_ctx(lambda code: storage.put(master_shard_path(shard_id, code), frame_to_parquet(master.store(code))))
     try:
-        p_id = "so_rawan_hilang/master_utama.xlsx"
-        url = f"https://res.cloudinary.com/{st.secrets['cloud_name']}/raw/upload/v{int(time.time())}/{p_id}"
-        resp = requests.get(url, timeout=15)
-        if resp.status_code == 200:
-            df = pd.read_excel(io.BytesIO(resp.content))
-            df.columns = [str(c).strip() for c in df.columns]
-            return df
-    except: return None
+        with ThreadPoolExecutor(SHARD_UPLOAD_WORKERS) as pool: directory["version"] = list(pool.map(put, directory.index))
+        return {"id": shard_id, "directory_version": storage.put(master_directory_path(shard_id), frame_to_parquet(directory.reset_index()))}
+    except:
+        try: storage.delete_prefix(f"{MASTER_SHARD_DIR}/{shard_id}/")
+        except StorageError: pass
+        raise
+
+def upload_master(content, compiled):
+    storage = get_storage()
+    storage.put(MASTER_PATH, content)
+    try: version = storage.put(MASTER_COMPILED_PATH, compiled)
+    except:
+        # JANGAN SAMPAI PARQUET LAMA TERBACA UNTUK MASTER BARU
+        storage.delete([MASTER_COMPILED_PATH]); version = None
+    # SHARD GAGAL -> master_shards KOSONG, SEMUA HALAMAN KEMBALI MEMBACA MASTER PENUH
+    try: shards = write_master_shards(MasterData(pd.read_parquet(io.BytesIO(compiled))))
+    except: shards = None
+    # VERSI PARQUET & SHARD DI CONFIG -> SEMUA PROSES PINDAH KE MASTER BARU DALAM CONFIG_TTL_SECONDS
+    config = load_config(fresh=True); old = config.get("master_shards")
+    config.update({"master_version": version, "master_shards": shards}); save_json_db(CONFIG_PATH, config)
+    if old:
+        try: storage.delete_prefix(f"{MASTER_SHARD_DIR}/{old['id']}/")
+        except StorageError: pass
+    reset_master()
+
+# --- MASTER DIPARSE SEKALI PER VERSI, OBJEKNYA DIPAKAI BERSAMA SEMUA SESI (TANPA PICKLE / COPY) ---
+@st.cache_resource
+def get_master_holder():
+    return {"lock": threading.Lock(), "master": None, "content": None, "version": None, "checked_at": 0.0}
+
+def reset_master():
+    holder = get_master_holder()
+    with holder["lock"]: holder["master"] = holder["content"] = None
+    holder = get_directory_holder()
+    with holder["lock"]: holder["id"] = holder["directory"] = None
+
+def get_master_info():
+    holder = get_master_holder()
+    version = load_config().get("master_version")
+    with holder["lock"]:
+        fresh = holder["version"] == version and (version or time.time() - holder["checked_at"] < MASTER_RECHECK_SECONDS)
+        if holder["master"] is not None and fresh: return holder["master"]
+        try:
+            storage = get_storage()
+            content = storage.get(MASTER_COMPILED_PATH, version=version, timeout=15)
+            parse = lambda c: MasterData(pd.read_parquet(io.BytesIO(c)), hashlib.sha1(c).hexdigest())
+            if not content:
+                content = storage.get(MASTER_PATH, timeout=15)
+                parse = lambda c: MasterData(normalize_frame(pd.read_excel(io.BytesIO(c))), hashlib.sha1(c).hexdigest())
+            if not content: return None
+            # BYTES YANG SAMA (304 / BLOB CACHE) TIDAK DIPARSE ULANG
+            if content is not holder["content"]:
+                with track("parse.master", len(content)): holder["master"], holder["content"] = parse(content), content
+            holder["version"], holder["checked_at"] = version, time.time()
+            return holder["master"]
+        except StorageError: raise
+        except: return None
+
+@st.cache_resource
+def get_directory_holder():
+    return {"lock": threading.Lock(), "id": None, "directory": None}
+
+def get_store_directory():
+    # DIRECTORY TOKO DIBACA SEKALI PER UPLOAD MASTER; MASTER LAMA TANPA SHARD -> DARI MASTER PENUH
+    shards = load_config().get("master_shards")
+    if not shards:
+        master = get_master_info()
+        return None if master is None else master.directory()
+    holder = get_directory_holder()
+    with holder["lock"]:
+        if holder["id"] == shards["id"]: return holder["directory"]
+        try:
+            content = get_storage().get(master_directory_path(shards["id"]), version=shards["directory_version"], timeout=15)
+            if not content: return None
+            with track("parse.master_directory", len(content)): directory = pd.read_parquet(io.BytesIO(content)).set_index("Kode Norm")
+            holder["id"], holder["directory"] = shards["id"], directory
+            return directory
+        except StorageError: raise
+        except: return None
+
+def get_master_store(code):
+    # HANYA SHARD TOKO INI YANG DI-DOWNLOAD; SHARD HILANG (MASTER BARU SAAT CONFIG MASIH LAMA) -> MASTER PENUH
+    code = str(code).strip().upper()
+    shards = load_config().get("master_shards")
+    directory = get_store_directory() if shards else None
+    if directory is not None:
+        if code not in directory.index: return directory.iloc[0:0]
+        content = get_storage().get(master_shard_path(shards["id"], code), version=int(directory.at[code, "version"]), timeout=15)
+        if content:
+            with track("parse.master_shard", len(content)): return pd.read_parquet(io.BytesIO(content))
+    master = get_master_info()
+    return None if master is None else master.store(code).copy()
+
+def frame_to_parquet(df):
+    buf = io.BytesIO(); normalize_frame(df.copy()).to_parquet(buf, index=False, compression="zstd")
+    return buf.getvalue()
+
+def read_result(content, public_id):
+    is_parquet = public_id.endswith(".parquet")
+    with track(f"parse.result_{'parquet' if is_parquet else 'xlsx'}", len(content)):
+        df = pd.read_parquet(io.BytesIO(content)) if is_parquet else pd.read_excel(io.BytesIO(content))
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
+
+def apply_deltas(df, deltas):
+    # BARIS DELTA (KEY PRDCD) MENIMPA NILAI DI FILE DASAR, URUT DARI DELTA TERLAMA
+    prd = next((c for c in df.columns if 'prdcd' in c.lower()), df.columns[4])
+    key = norm_key(df[prd]).values
+    for d_df in deltas:
+        d_prd = next((c for c in d_df.columns if 'prdcd' in c.lower()), d_df.columns[0])
+        d_df = d_df[~norm_key(d_df[d_prd]).duplicated(keep='last')]
+        pos = pd.Index(norm_key(d_df[d_prd]).values).get_indexer(key)
+        hit = pos >= 0
+        if not hit.any(): continue
+        for c in [c for c in d_df.columns if c != d_prd and c in df.columns]:
+            df[c] = pd.Series(d_df[c].values[np.where(hit, pos, 0)], index=df.index).where(hit, df[c])
+    return df
+
+def load_deltas(entry):
+    frames = []
+    for d in entry.get("deltas", []):
+        content = get_storage().get(d["public_id"], version=d.get("version"))
+        if content is None: raise StorageError(f"Delta {d['public_id']} tidak ditemukan")
+        frames.append(read_result(content, d["public_id"]))
+    return frames
 
 def load_user_save(toko_id, project_id):
+    # FILE DASAR DARI MANIFEST + DELTA; TANPA ENTRY: PARQUET, XLSX, LALU FILE LAMA.
+    # GAGAL FETCH -> StorageError (JANGAN TAMPIL SEBAGAI BELUM DIISI)
+    entry = load_manifest(project_id)["stores"].get(str(toko_id).strip().upper())
+    candidates = [(entry["public_id"], entry.get("version"))] if entry else [(path, None) for path in [result_path(toko_id, project_id), result_path(toko_id, project_id, "xlsx"), legacy_result_path(toko_id, project_id)]]
+    for path, version in candidates:
+        content = get_storage().get(path, version=version)
+        if content:
+            try: df = read_result(content, path)
+            except: return None
+            return apply_deltas(df, load_deltas(entry)) if entry and entry.get("deltas") else df
+    return None
+
+# --- STRUKTUR FOLDER HASIL: hasil/{project_id}/Hasil_{toko}.xlsx ---
+def result_prefix(p_id):
+    return f"{RESULT_DIR}/{p_id}/"
+
+def result_path(toko_id, p_id, ext="parquet"):
+    return f"{result_prefix(p_id)}Hasil_{toko_id}.{ext}"
+
+def delta_prefix(p_id, toko_id=""):
+    return f"{result_prefix(p_id)}delta/{f'{toko_id}/' if toko_id else ''}"
+
+def legacy_result_path(toko_id, p_id):
+    return f"{RESULT_DIR}/Hasil_{toko_id}_{p_id}.xlsx"
+
+def store_code_of(public_id, p_id):
+    name = public_id.rsplit("/", 1)[-1].split("Hasil_")[-1]
+    return name.split(f"_{p_id}")[0].split(".")[0].strip().upper()
+
+def list_resources(prefix):
+    return get_storage().list(prefix)
+
+def migrate_legacy_results():
+    # FILE LAMA hasil/Hasil_{toko}_{project_id}.xlsx DIPINDAH KE hasil/{project_id}/Hasil_{toko}.xlsx
+    moves = []
+    for r in list_resources(f"{RESULT_DIR}/Hasil_"):
+        name = r["public_id"].rsplit("/", 1)[-1].rsplit(".", 1)[0]
+        toko_id, _, p_id = name[len("Hasil_"):].rpartition("_")
+        if toko_id and p_id: moves.append((r["public_id"], result_path(toko_id, p_id, "xlsx"), p_id))
+    with ThreadPoolExecutor(8) as pool: list(pool.map(lambda m: get_storage().rename(m[0], m[1]), moves))
+    get_storage().forget(f"{RESULT_DIR}/")
+    # PROJECT LAMA HASIL MIGRASI DIDAFTARKAN KE CONFIG -> IKUT TERHAPUS SAAT HAPUS INPUTAN LAMA / PUBLISH
+    config = load_config(fresh=True)
+    new_projects = {m[2] for m in moves} - set(config.get("projects", [])) - {str(config.get("active_id"))}
+    if new_projects: save_json_db(CONFIG_PATH, {**config, "projects": config.get("projects", []) + sorted(new_projects)})
+    return len(moves)
+
+def list_result_projects():
+    # PROJECT ID DARI NAMA FOLDER hasil/{project_id}/ (JUGA YANG TIDAK TERCATAT DI CONFIG), BUKAN LISTING SEMUA FILE
+    return set(get_storage().folders(RESULT_DIR))
+
+# --- MANIFEST SUBMIT PER PROJECT (PENGGANTI LISTING SEMUA FILE HASIL) ---
+def manifest_path(p_id):
+    return f"{result_prefix(p_id)}manifest.json"
+
+@st.cache_resource
+def get_manifest_lock():
+    return threading.RLock()
+
+def rebuild_manifest(p_id):
+    stores = {}
+    # FILE LAMA (BELUM DIMIGRASI) DULU, LALU FOLDER PROJECT SUPAYA VERSI BARU YANG MENANG
+    legacy = [r for r in list_resources(f"{RESULT_DIR}/Hasil_") if f"_{p_id}" in r["public_id"]]
+    scoped = sorted(list_resources(f"{result_prefix(p_id)}Hasil_"), key=lambda r: r["public_id"].endswith(".parquet"))
+    for r in legacy + scoped:
+        stores[store_code_of(r["public_id"], p_id)] = {"public_id": r["public_id"], "version": r.get("version"), "ts": r.get("created_at"), "rows": None, "nik": None, "deltas": []}
+    deltas = {}
+    for r in list_resources(delta_prefix(p_id)):
+        deltas.setdefault(r["public_id"].split("/")[-2], []).append({"public_id": r["public_id"], "version": r.get("version")})
+    with get_manifest_lock():
+        # LISTING BISA TERTINGGAL (CDN / SUBMIT SAAT REBUILD / PROSES LAIN) -> ENTRY TERSIMPAN TIDAK PERNAH DIBUANG:
+        # ENTRY TERSIMPAN MENANG KALAU VERSINYA SAMA / LEBIH BARU (ADA NIK & JUMLAH BARIS), DELTA DIGABUNG DARI KEDUANYA
+        for code, e in load_json_latest(manifest_path(p_id)).get("stores", {}).items():
+            listed = stores.get(code)
+            if listed is None or (e.get("version") or 0) >= (listed["version"] or 0): stores[code] = {**e, "deltas": e.get("deltas", []) + (listed or {}).get("deltas", [])}
+        # DELTA YANG TIDAK LEBIH TUA DARI FILE DASAR IKUT DIPASANG, URUT VERSI, TANPA DOBEL
+        for code, e in stores.items():
+            merged = {d["public_id"]: d for d in e["deltas"] + deltas.get(code, []) if (d["version"] or 0) >= (e["version"] or 0)}
+            e["deltas"] = sorted(merged.values(), key=lambda d: d["version"] or 0)
+        manifest = {"stores": stores}
+        save_json_db(manifest_path(p_id), manifest)
+    return manifest
+
+def record_submission(p_id, code, entry):
+    # LOCK PROSES: SUBMIT BERSAMAAN DARI BANYAK SESI TIDAK SALING MENIMPA ENTRY
+    with get_manifest_lock():
+        manifest = load_manifest(p_id, latest=True)
+        manifest["stores"][code] = entry
+        save_json_db(manifest_path(p_id), manifest)
+
+def load_manifest(p_id, latest=False):
+    # latest = DIBACA UNTUK DITULIS ULANG (DI BAWAH LOCK MANIFEST)
+    manifest = load_json_latest(manifest_path(p_id)) if latest else load_json_db(manifest_path(p_id))
+    return manifest if "stores" in manifest else rebuild_manifest(p_id)
+
+def record_delta(p_id, code, delta, meta):
+    with get_manifest_lock():
+        manifest = load_manifest(p_id, latest=True)
+        entry = manifest["stores"][code]
+        entry.update({**meta, "deltas": entry.get("deltas", []) + [delta]})
+        save_json_db(manifest_path(p_id), manifest)
+
+def manifest_behind(p_id, stores):
+    # FILE HASIL / DELTA DI FOLDER PROJECT YANG BELUM (ATAU VERSI LAMA) TERCATAT DI MANIFEST
+    for r in list_resources(f"{result_prefix(p_id)}Hasil_"):
+        e = stores.get(store_code_of(r["public_id"], p_id))
+        if e is None or (r.get("version") or 0) > (e.get("version") or 0): return True
+    known = {d["public_id"] for e in stores.values() for d in e.get("deltas", [])}
+    for r in list_resources(delta_prefix(p_id)):
+        e = stores.get(r["public_id"].split("/")[-2])
+        if r["public_id"] not in known and e is not None and (r.get("version") or 0) >= (e.get("version") or 0): return True
+    return False
+
+def list_submissions(p_id, reconcile=False):
+    # version = REVISI TERAKHIR (DELTA TERBARU ATAU FILE DASAR) -> REKAP INKREMENTAL IKUT MENANGKAP DELTA.
+    # reconcile (SAAT REKAP): MANIFEST DICOCOKKAN KE LISTING FOLDER PROJECT, ENTRY YANG HILANG DIPASANG ULANG
+    manifest = load_manifest(p_id)
+    if reconcile and manifest_behind(p_id, manifest["stores"]): manifest = rebuild_manifest(p_id)
+    return [{"public_id": e["public_id"], "version": e["deltas"][-1]["version"] if e.get("deltas") else e.get("version"), "base_version": e.get("version"), "deltas": e.get("deltas", [])}
+            for e in manifest["stores"].values()]
+
+# --- PROGRES DASHBOARD: ROLLUP AM/AS, DITAMBAH PER TOKO YANG SUBMIT ---
+class ProgressRollup:
+    def __init__(self, directory, submitted):
+        self.lock = threading.Lock()
+        self.directory = directory
+        self.group_of = {key: self.directory[key].to_dict() for key in ["AM", "AS"]}
+        self.members = {key: self.directory.groupby(key).groups for key in ["AM", "AS"]}
+        self.target = {key: self.directory[key].value_counts().to_dict() for key in ["AM", "AS"]}
+        done = self.directory.index.isin(list(submitted))
+        self.submitted = set(self.directory.index[done])
+        self.sudah = {key: self.directory.loc[done, key].value_counts().to_dict() for key in ["AM", "AS"]}
+        self.synced_at = self.built_at = time.time()
+
+    def mark(self, code):
+        code = str(code).strip().upper()
+        with self.lock:
+            if code not in self.group_of["AM"] or code in self.submitted: return
+            self.submitted.add(code)
+            for key in ["AM", "AS"]:
+                grp = self.group_of[key][code]
+                if pd.notna(grp): self.sudah[key][grp] = self.sudah[key].get(grp, 0) + 1
+
+    def summary(self, key):
+        with self.lock:
+            rows = [(grp, n, self.sudah[key].get(grp, 0)) for grp, n in self.target[key].items()]
+        df = pd.DataFrame(rows, columns=[key, "Target Toko SO", "Sudah SO"])
+        df["Belum SO"] = df["Target Toko SO"] - df["Sudah SO"]
+        df["Progres"] = (df["Sudah SO"] / df["Target Toko SO"]) * 100
+        return df.sort_values(by=["Progres", "Target Toko SO"], ascending=[True, False])
+
+    def totals(self):
+        with self.lock: return sum(self.target["AM"].values()), sum(self.sudah["AM"].values())
+
+    def pending(self, key, grp):
+        codes = self.members[key].get(grp, [])
+        with self.lock: todo = [c for c in codes if c not in self.submitted]
+        return self.directory.loc[todo, ["Kode", "Nama"]]
+
+@st.cache_resource
+def get_progress_registry():
+    return {"lock": threading.Lock()}
+
+def progress_due(p_id):
+    rollup = get_progress_registry().get(p_id)
+    return rollup is None or time.time() - rollup.built_at > PROGRESS_REBUILD_SECONDS or time.time() - rollup.synced_at > PROGRESS_SYNC_SECONDS
+
+def progress_stores(p_id):
+    # MANIFEST HANYA DIBACA KALAU ROLLUP PERLU DIBANGUN / DISINKRON (BISA DI-PREFETCH PARALEL DENGAN MASTER)
+    return load_manifest(p_id)["stores"] if progress_due(p_id) else None
+
+def get_progress(directory, p_id, stores=None):
+    # ROLLUP DIBANGUN SEKALI PER PROJECT, LALU HANYA DISINKRON DENGAN MANIFEST (SUBMIT DARI PROSES LAIN)
+    reg = get_progress_registry()
+    with reg["lock"]:
+        rollup = reg.get(p_id)
+        if rollup is None or time.time() - rollup.built_at > PROGRESS_REBUILD_SECONDS:
+            rollup = reg[p_id] = ProgressRollup(directory, stores if stores is not None else load_manifest(p_id)["stores"])
+            for old in [k for k in reg if k not in ("lock", p_id)]: reg.pop(old)
+        elif time.time() - rollup.synced_at > PROGRESS_SYNC_SECONDS:
+            for code in set(stores if stores is not None else load_manifest(p_id)["stores"]) - rollup.submitted: rollup.mark(code)
+            rollup.synced_at = time.time()
+    return rollup
+
+def mark_store_submitted(p_id, code):
+    rollup = get_progress_registry().get(p_id)
+    if rollup is not None: rollup.mark(code)
+
+def reset_progress():
+    reg = get_progress_registry()
+    with reg["lock"]:
+        for k in [k for k in reg if k != "lock"]: reg.pop(k)
+
+def merge_rekap(m_df, store_frames, m_codes=None):
+    # JOIN PER (KODE TOKO, PRDCD): KEY DINORMALISASI SEKALI, KOLOM DITULIS SEKALIGUS
+    m_prd = next((c for c in m_df.columns if 'prdcd' in c.lower()), m_df.columns[4])
+    if m_codes is None: m_codes = norm_code(m_df[m_df.columns[0]])
+    m_key = pd.Index(m_codes.values + "\x1f" + norm_key(m_df[m_prd]).values)
+    updates = {}
+    for s_df in store_frames:
+        s_tk, s_prd = s_df.columns[0], next((c for c in s_df.columns if 'prdcd' in c.lower()), s_df.columns[4])
+        trgt = [c for c in s_df.columns if any(x in c.lower() for x in ['sales', 'fisik', 'selisih'])]
+        s_key = (norm_code(s_df[s_tk]) + "\x1f" + norm_key(s_df[s_prd])).values
+        for c in trgt: updates.setdefault(c, []).append(pd.Series(s_df[c].values, index=s_key))
+    for c, parts in updates.items():
+        vals = pd.concat(parts)
+        vals = vals[~vals.index.duplicated(keep='last')]
+        pos = vals.index.get_indexer(m_key)
+        hit = pos >= 0
+        if not hit.any(): continue
+        new_vals = pd.Series(vals.values[np.where(hit, pos, 0)], index=m_df.index)
+        m_df[c] = new_vals.where(hit, m_df[c] if c in m_df.columns else np.nan)
+    return m_df
+
+def fetch_store_results(resources, p_id, on_progress=None):
+    storage = get_storage()
+    def download(r):
+        content = storage.get(r['public_id'], version=r.get('base_version', r.get('version')), timeout=30)
+        if content is None: raise FileNotFoundError(r['public_id'])
+        deltas = [storage.get(d['public_id'], version=d.get('version'), timeout=30) for d in r.get('deltas', [])]
+        if any(d is None for d in deltas): raise FileNotFoundError(f"delta {r['public_id']}")
+        return content, deltas
+    # PARSE DI THREAD POOL YANG SAMA (SUBMIT BARU PARQUET; XLSX LAMA JARANG). TANPA PROCESS POOL:
+    # fork DARI SERVER MULTI-THREAD BISA MEWARISI LOCK (CACHE / HTTP / METRIK) YANG SEDANG DIPEGANG -> CHILD DEADLOCK
+    frames, failed, parsing, deltas = {}, {}, {}, {}
+    with ThreadPoolExecutor(REKAP_FETCH_WORKERS) as pool:
+        downloads = {pool.submit(download, r): r for r in resources}
+        for fut in as_completed(downloads):
+            r = downloads[fut]; code = store_code_of(r['public_id'], p_id)
+            try: content, deltas[code] = fut.result()
+            except Exception as e: failed[code] = f"Download gagal: {e}"
+            else: parsing[code] = pool.submit(read_result, content, r['public_id'])
+            if on_progress: on_progress(len(parsing) + len(failed), len(resources))
+        for r in resources:
+            code = store_code_of(r['public_id'], p_id)
+            if code not in parsing: continue
+            try:
+                s_df = parsing[code].result()
+                if deltas[code]: s_df = apply_deltas(s_df, [read_result(c, d['public_id']) for c, d in zip(deltas[code], r['deltas'])])
+                frames[code] = s_df
+            except Exception as e: failed[code] = f"File rusak: {e}"
+    return frames, failed
+
+@st.cache_resource
+def get_rekap_cache():
+    return {}
+
+def load_rekap_state(p_id, master_version):
+    # STATE DARI MASTER LAIN (MASTER DI-UPDATE OLEH PROSES LAIN) TIDAK DIPAKAI -> REKAP DIBANGUN ULANG DARI MASTER BARU
+    cache = get_rekap_cache()
+    if p_id in cache and cache[p_id]["master_version"] == master_version: return cache[p_id]
+    state = {"versions": {}, "merged": None, "master_version": master_version}
     try:
-        path_file = f"so_rawan_hilang/hasil/Hasil_{toko_id}_{project_id}.xlsx"
-        url = f"https://res.cloudinary.com/{st.secrets['cloud_name']}/raw/upload/v{int(time.time())}/{path_file}"
-        resp = requests.get(url, timeout=10)
-        if resp.status_code == 200:
-            df = pd.read_excel(io.BytesIO(resp.content))
-            df.columns = [str(c).strip() for c in df.columns]
-            return df
-    except: return None
+        saved = load_json_db(f"{REKAP_DIR}/state_{p_id}.json")
+        if saved.get("versions") and saved.get("master_version") == master_version:
+            content = get_storage().get(f"{REKAP_DIR}/merged_{p_id}.parquet", version=saved['merged_version'], timeout=30)
+            if content:
+                with track("parse.rekap_state", len(content)): state = {"versions": saved["versions"], "merged": pd.read_parquet(io.BytesIO(content)), "master_version": master_version}
+    except: pass
+    cache[p_id] = state
+    return state
 
-@st.cache_data(ttl=60)
-def get_progress_rankings(df_master):
+def save_rekap_state(p_id, versions, merged, master_version):
+    get_rekap_cache()[p_id] = {"versions": versions, "merged": merged, "master_version": master_version}
     try:
-        p_id_active = get_active_project_id()
-        if p_id_active == "BELUM_ADA_MASTER_AKTIF":
-            return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+        buf = io.BytesIO(); merged.to_parquet(buf, index=False)
+        version = get_storage().put(f"{REKAP_DIR}/merged_{p_id}.parquet", buf.getvalue())
+        save_json_db(f"{REKAP_DIR}/state_{p_id}.json", {"versions": versions, "merged_version": version, "master_version": master_version})
+    except: pass
 
-        submitted_codes = set()
-        next_cursor = None
-        # LOOP PAGINATION AGAR TOKO > 500 TERBACA SEMUA
-        while True:
-            res = cloudinary.api.resources(resource_type="raw", type="upload", prefix="so_rawan_hilang/hasil/Hasil_", max_results=500, next_cursor=next_cursor)
-            for r in res.get("resources", []):
-                if f"_{p_id_active}" in r["public_id"]:
-                    code = r["public_id"].split("Hasil_")[-1].split(f"_{p_id_active}")[0]
-                    submitted_codes.add(code.strip().upper())
-            next_cursor = res.get("next_cursor")
-            if not next_cursor: break
-        
-        df_temp = df_master.iloc[:, [0, 1, 2, 3]].copy()
-        df_temp.columns = ["Kode", "Nama", "AM", "AS"]
-        df_temp = df_temp.drop_duplicates()
-        df_temp['Status'] = df_temp['Kode'].astype(str).str.strip().str.upper().apply(lambda x: 1 if x in submitted_codes else 0)
-        
-        am_sum = df_temp.groupby("AM").agg(Target=('Kode', 'count'), Sudah=('Status', 'sum')).reset_index()
-        am_sum['Belum SO'] = am_sum['Target'] - am_sum['Sudah']
-        am_sum['Progres'] = (am_sum['Sudah'] / am_sum['Target']) * 100
-        am_sum.columns = ["AM", "Target Toko SO", "Sudah SO", "Belum SO", "Progres"]
-        am_sum = am_sum.sort_values(by=["Progres", "Target Toko SO"], ascending=[True, False])
-
-        as_sum = df_temp.groupby("AS").agg(Target=('Kode', 'count'), Sudah=('Status', 'sum')).reset_index()
-        as_sum['Belum SO'] = as_sum['Target'] - as_sum['Sudah']
-        as_sum['Progres'] = (as_sum['Sudah'] / as_sum['Target']) * 100
-        as_sum.columns = ["AS", "Target Toko SO", "Sudah SO", "Belum SO", "Progres"]
-        as_sum = as_sum.sort_values(by=["Progres", "Target Toko SO"], ascending=[True, False])
-        
-        return df_temp, am_sum, as_sum
-    except: return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-
-def delete_old_reports(active_id):
+def clear_rekap_state(p_id):
+    # GAGAL HAPUS -> ERROR (STATE LAMA BISA IKUT TERGABUNG DENGAN MASTER BARU)
+    cancel_rekap_jobs([p_id]); get_rekap_cache().pop(p_id, None)
+    get_storage().delete([f"{REKAP_DIR}/state_{p_id}.json", f"{REKAP_DIR}/merged_{p_id}.parquet", rekap_job_path(p_id)] + [rekap_artifact_path(p_id, fmt) for fmt in EXPORT_FORMATS])
+
+def build_rekap(master, resources, p_id, on_progress=None):
+    # HANYA TOKO BARU / BERUBAH (VERSI BEDA) YANG DI-DOWNLOAD ULANG & DITAMBAL KE HASIL MERGE SEBELUMNYA
+    state = load_rekap_state(p_id, master.version)
+    current = {store_code_of(r['public_id'], p_id): r.get('version') for r in resources}
+    versions = dict(state["versions"])
+    if state["merged"] is None or any(code not in current for code in versions):
+        base, versions = master.df.copy(), {}
+    else:
+        base = state["merged"].copy()
+    todo = [r for r in resources if versions.get(store_code_of(r['public_id'], p_id)) != r.get('version')]
+    frames, failed = fetch_store_results(todo, p_id, on_progress=on_progress)
+    with track("rekap.merge"): merged = merge_rekap(base, list(frames.values()), m_codes=master.row_codes)
+    versions.update({code: current[code] for code in frames})
+    if frames or state["merged"] is None: save_rekap_state(p_id, versions, merged, master.version)
+    return merged, failed, len(todo)
+
+def export_rekap(df, fmt, name):
+    # FILE DITULIS PER CHUNK KE .tmp LALU DI-RENAME, TIDAK ADA SALINAN WORKBOOK DI RAM
+    os.makedirs(REKAP_EXPORT_DIR, exist_ok=True)
+    path = os.path.join(REKAP_EXPORT_DIR, f"{name}.{fmt}")
+    tmp = f"{path}.tmp"
+    chunks = (df.iloc[i:i + EXPORT_CHUNK_ROWS] for i in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS))
+    if fmt == "csv":
+        with open(tmp, "w", newline="", encoding="utf-8-sig") as f:
+            for i, chunk in enumerate(chunks): chunk.to_csv(f, index=False, header=(i == 0))
+    elif fmt == "parquet":
+        df = normalize_frame(df.copy(deep=False))
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+            for chunk in chunks: writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    else:
+        wb = openpyxl.Workbook(write_only=True); ws = wb.create_sheet("Sheet1")
+        ws.append([str(c) for c in df.columns])
+        for chunk in chunks:
+            for row in chunk.itertuples(index=False, name=None): ws.append([None if pd.isna(v) else v for v in row])
+        wb.save(tmp)
+    os.replace(tmp, path)
+    return path
+
+# --- JOB REKAP DI BACKGROUND: 1 JOB PER PROJECT, PROGRES PER TOKO, STATE & FILE HASIL DI STORAGE ---
+def rekap_job_path(p_id): return f"{REKAP_DIR}/job_{p_id}.json"
+def rekap_artifact_path(p_id, fmt): return f"{REKAP_DIR}/Rekap_SO_{p_id}.{fmt}"
+
+def rekap_local_path(job): return os.path.join(REKAP_EXPORT_DIR, f"Rekap_SO_{job['p_id']}_{job['artifact_version']}.{job['fmt']}")
+
+@st.cache_resource
+def get_rekap_jobs():
+    # JOB YANG DIJALANKAN PROSES INI (+ THREAD-NYA); JOB DARI PROSES LAIN / SEBELUM RESTART DIBACA DARI STORAGE
+    return {"lock": threading.RLock(), "jobs": {}, "threads": {}}
+
+def save_rekap_job(job):
+    try: save_json_db(rekap_job_path(job["p_id"]), job)
+    except StorageError: pass
+
+def cancel_rekap_jobs(p_ids=None):
+    # JOB YANG THREAD-NYA MASIH JALAN TETAP TERCATAT (running) SAMPAI THREAD BERHENTI SENDIRI DI CEK BERIKUTNYA;
+    # JOB YANG SUDAH SELESAI DIBUANG DARI DAFTAR
+    reg = get_rekap_jobs()
+    with reg["lock"]:
+        for p_id in [p for p in reg["jobs"] if p_ids is None or p in p_ids]:
+            thread = reg["threads"].get(p_id)
+            if thread is not None and thread.is_alive(): reg["jobs"][p_id].update({"cancelled": True, "stage": "cancel"})
+            else: reg["jobs"].pop(p_id)
+
+def get_rekap_job(p_id):
+    reg = get_rekap_jobs()
+    with reg["lock"]:
+        job, thread = reg["jobs"].get(p_id), reg["threads"].get(p_id)
+        job = dict(job) if job else None
+    if job is None: job = load_json_db(rekap_job_path(p_id)) or None
+    # THREAD MASIH HIDUP (MIS. SEDANG BERHENTI SETELAH DIBATALKAN) -> MASIH running, JOB BARU BELUM BOLEH MULAI
+    if job and thread is not None and thread.is_alive(): job["status"] = "running"
+    # "running" TAPI THREAD SUDAH MATI / LAMA TIDAK UPDATE (APP RESTART DI TENGAH JALAN) -> TERPUTUS, BOLEH DIULANG
+    if job and job["status"] == "running" and ((thread is not None and not thread.is_alive()) or time.time() - job["heartbeat"] > REKAP_JOB_STALE_SECONDS): job["status"] = "interrupted"
+    return job
+
+def start_rekap_job(master, resources, p_id, fmt):
+    # JOB YANG MASIH JALAN UNTUK PROJECT INI DIKEMBALIKAN, TIDAK DIMULAI DOBEL
+    reg = get_rekap_jobs()
+    with reg["lock"]:
+        job = get_rekap_job(p_id)
+        if job and job["status"] == "running": return job
+        prev = job.get("artifact") if job else None
+        job = {"p_id": p_id, "fmt": fmt, "status": "running", "stage": "download", "done": 0, "total": 0, "n_stores": len(resources), "n_fetch": 0,
+               "failed": {}, "error": None, "started": get_now_wita().strftime('%Y-%m-%d %H:%M:%S'), "finished": None, "heartbeat": time.time(),
+               "artifact": None, "artifact_version": None, "prev_artifact": prev}
+        reg["jobs"][p_id] = job
+        # SINGLETON (cache_resource) DIAMBIL DI THREAD SCRIPT: THREAD JOB TANPA CONTEXT SESI, JADI TIDAK BOLEH ADA CACHE MISS
+        # DI SANA (SPINNER CACHE MISS MEMAKAI SESI YANG BISA SUDAH RERUN / TUTUP)
+        storage = get_storage(); get_metrics(); get_rekap_cache()
+        thread = reg["threads"][p_id] = threading.Thread(target=run_rekap_job, args=(job, master, resources, storage, reg), daemon=True, name=f"rekap-{p_id}")
+    save_rekap_job(job)
+    thread.start()
+    return dict(job)
+
+def run_rekap_job(job, master, resources, storage, reg):
+    last_save = [time.time()]
+    def persist():
+        # JOB YANG SUDAH DIGANTI JOB BARU (DIANGGAP TERPUTUS LALU DIULANG) / DIBATALKAN TIDAK MENIMPA STATE DI STORAGE
+        if reg["jobs"].get(job["p_id"]) is job and not job.get("cancelled"): save_rekap_job(job)
+    def check_cancel():
+        # MASTER DI-UPDATE / DITERBITKAN SELAMA JOB JALAN (cancel_rekap_jobs) -> BERHENTI SEBELUM MENULIS FILE REKAP
+        if job.get("cancelled"): raise InterruptedError("Rekap dibatalkan karena master diperbarui, silakan gabung ulang.")
+    def progress(d, t):
+        check_cancel()
+        job.update({"done": d, "total": t, "heartbeat": time.time()})
+        if time.time() - last_save[0] >= REKAP_JOB_SAVE_SECONDS: last_save[0] = time.time(); persist()
+    out_path = None
     try:
-        next_cursor = None
-        deleted_count = 0
-        while True:
-            res = cloudinary.api.resources(resource_type="raw", type="upload", prefix="so_rawan_hilang/hasil/Hasil_", max_results=500, next_cursor=next_cursor)
-            for r in res.get("resources", []):
-                if f"_{active_id}" not in r['public_id']:
-                    cloudinary.uploader.destroy(r['public_id'], resource_type="raw")
-                    deleted_count += 1
-            next_cursor = res.get('next_cursor')
-            if not next_cursor: break
-        return True, deleted_count
-    except Exception as e: return False, str(e)
+        merged, failed, n_fetch = build_rekap(master, resources, job["p_id"], on_progress=progress)
+        check_cancel()
+        job.update({"failed": failed, "n_fetch": n_fetch, "stage": "export", "heartbeat": time.time()})
+        with track(f"rekap.export_{job['fmt']}") as tr:
+            out_path = export_rekap(merged, job["fmt"], f"Rekap_SO_{job['p_id']}"); tr["bytes"] = os.path.getsize(out_path)
+        del merged
+        # UPLOAD LANGSUNG DARI FILE; FILE LOKAL DISIMPAN PER VERSI -> DOWNLOAD DI PROSES INI TIDAK PERLU AMBIL ULANG
+        check_cancel()
+        job.update({"stage": "upload", "heartbeat": time.time()})
+        artifact = rekap_artifact_path(job["p_id"], job["fmt"])
+        version = storage.put_file(artifact, out_path)
+        job.update({"artifact": artifact, "artifact_version": version})
+        check_cancel()
+        os.replace(out_path, rekap_local_path(job))
+        for name in os.listdir(REKAP_EXPORT_DIR):
+            if name.startswith(f"Rekap_SO_{job['p_id']}_") and os.path.join(REKAP_EXPORT_DIR, name) != rekap_local_path(job): os.remove(os.path.join(REKAP_EXPORT_DIR, name))
+        if job["prev_artifact"] and job["prev_artifact"] != artifact:
+            try: storage.delete([job["prev_artifact"]])
+            except StorageError: pass
+        check_cancel()
+        job["status"] = "done"
+    except BaseException as e:
+        # BaseException JUGA (StopException / RerunException DARI st.*): JOB SELALU BERAKHIR error, TIDAK MENGGANTUNG DI running
+        job.update({"status": "error", "error": str(e) or type(e).__name__})
+        if job.get("cancelled"):
+            # STATE / FILE REKAP DARI MASTER LAMA YANG SEMPAT DITULIS JOB INI DIBUANG (JOB BARU MENUNGGU THREAD INI SELESAI)
+            get_rekap_cache().pop(job["p_id"], None)
+            try: storage.delete([f"{REKAP_DIR}/state_{job['p_id']}.json", f"{REKAP_DIR}/merged_{job['p_id']}.parquet", rekap_artifact_path(job["p_id"], job["fmt"])])
+            except StorageError: pass
+            for path in [p for p in [out_path, job["artifact_version"] and rekap_local_path(job)] if p and os.path.exists(p)]: os.remove(path)
+    finally:
+        job.update({"finished": get_now_wita().strftime('%Y-%m-%d %H:%M:%S'), "heartbeat": time.time(), "prev_artifact": None})
+        persist()
+
+def open_rekap_artifact(job, storage):
+    # DIPANGGIL SAAT TOMBOL DOWNLOAD DIKLIK (BUKAN TIAP RERUN): FILE LOKAL VERSI INI, KALAU BELUM ADA DI-STREAM SEKALI DARI STORAGE
+    local = rekap_local_path(job)
+    if not os.path.exists(local):
+        os.makedirs(REKAP_EXPORT_DIR, exist_ok=True)
+        if not storage.get_file(job["artifact"], job["artifact_version"], local): raise StorageError("File rekap tidak ditemukan, silakan gabung ulang.")
+    with open(local, "rb") as f: return f.read()
+
+def submit_store(data_full, toko_code, p_id, nik):
+    content = frame_to_parquet(data_full)
+    p_id_file = result_path(toko_code, p_id)
+    version = get_storage().put(p_id_file, content)
+    record_submission(p_id, toko_code, {"public_id": p_id_file, "version": version, "ts": get_now_wita().strftime('%Y-%m-%d %H:%M:%S'), "rows": len(data_full), "nik": nik})
+    mark_store_submitted(p_id, toko_code)
+
+def submit_store_changes(data_full, changed, toko_code, p_id, nik):
+    # changed = BARIS YANG BERUBAH DARI HASIL TERSIMPAN (None = BELUM PERNAH SUBMIT) -> DIKIRIM SEBAGAI DELTA.
+    # FILE PENUH KALAU BELUM ADA ENTRY / DELTA SUDAH DELTA_COMPACT_AFTER, LALU DELTA LAMA DIHAPUS
+    entry = load_manifest(p_id)["stores"].get(toko_code)
+    if changed is None or entry is None or len(entry.get("deltas", [])) >= DELTA_COMPACT_AFTER:
+        submit_store(data_full, toko_code, p_id, nik)
+        if entry and entry.get("deltas"): get_storage().delete([d["public_id"] for d in entry["deltas"]])
+        return len(data_full)
+    if changed.empty: return 0
+    path = f"{delta_prefix(p_id, toko_code)}{time.time_ns()}.parquet"
+    version = get_storage().put(path, frame_to_parquet(changed))
+    record_delta(p_id, toko_code, {"public_id": path, "version": version}, {"ts": get_now_wita().strftime('%Y-%m-%d %H:%M:%S'), "nik": nik})
+    return len(changed)
+
+def delete_project_results(p_id):
+    deleted = get_storage().delete_prefix(result_prefix(p_id))
+    # FOLDER KOSONGNYA IKUT DIHAPUS -> PROJECT TIDAK MUNCUL LAGI DI list_result_projects
+    try: get_storage().delete_folder(result_prefix(p_id).rstrip("/"))
+    except StorageError: pass
+    return deleted
+
+def delete_old_reports(active_id, on_progress=None):
+    # BISA DIULANG: YANG SUDAH TERHAPUS TIDAK MUNCUL LAGI DI LISTING / DAFTAR PROJECT
+    deleted_count, done_projects, errors = 0, [], []
+    try:
+        config = load_config(fresh=True)
+        old_projects = sorted((set(config.get("projects", [])) | list_result_projects()) - {active_id})
+        legacy = [r['public_id'] for r in list_resources(f"{RESULT_DIR}/Hasil_") if f"_{active_id}" not in r['public_id']]
+        batches = [legacy[i:i + DELETE_BATCH_SIZE] for i in range(0, len(legacy), DELETE_BATCH_SIZE)]
+        with ThreadPoolExecutor(DELETE_WORKERS) as pool:
+            jobs = {pool.submit(delete_project_results, p): p for p in old_projects}
+            jobs.update({pool.submit(get_storage().delete, b): None for b in batches})
+            for i, fut in enumerate(as_completed(jobs)):
+                try:
+                    deleted_count += fut.result()
+                    if jobs[fut]: done_projects.append(jobs[fut])
+                except Exception as e: errors.append(str(e))
+                if on_progress: on_progress(i + 1, len(jobs), deleted_count)
+    except Exception as e: errors.append(str(e))
+    if done_projects:
+        try:
+            config = load_config(fresh=True)
+            config["projects"] = [p for p in config.get("projects", []) if p not in done_projects]
+            save_json_db(CONFIG_PATH, config)
+        except StorageError as e: errors.append(str(e))
+    if errors: return False, f"{errors[0]} ({deleted_count} file sudah terhapus, ulangi untuk melanjutkan)"
+    return True, deleted_count
 
 # =================================================================
 # 4. DIALOGS, FRAGMENTS & PAGES
@@ -178,7 +1499,8 @@ def delete_old_reports(active_id):
 def confirm_delete_old_data(active_id):
     st.error(f"⚠️ Hapus semua file yang BUKAN Project ID: {active_id}?")
     if st.button("IYA, Hapus Sekarang", type="primary", use_container_width=True):
-        ok, res = delete_old_reports(active_id)
+        bar = st.progress(0.0, text="Menyiapkan daftar file...")
+        ok, res = delete_old_reports(active_id, on_progress=lambda d, t, n: bar.progress(d / t, text=f"Terhapus {n} file ({d}/{t} batch)"))
         if ok:
             st.success(f"✅ Berhasil menghapus {res} file!"); time.sleep(1.5); st.rerun()
         else: st.error(f"Gagal: {res}")
@@ -189,11 +1511,20 @@ def confirm_admin_publish(file_obj):
     if st.button("IYA, Publish & Reset Sekarang", type="primary", use_container_width=True):
         done = False
         try:
+            content = file_obj.getvalue(); compiled = compile_master(content)
             new_id = str(int(time.time()))
-            save_json_db(CONFIG_PATH, {"active_id": new_id, "maintenance_mode": is_maintenance_mode()})
-            cloudinary.api.delete_resources_by_prefix("so_rawan_hilang/hasil/", resource_type="raw")
-            cloudinary.uploader.upload(file_obj, resource_type="raw", public_id="so_rawan_hilang/master_utama.xlsx", overwrite=True, invalidate=True)
-            st.cache_data.clear()
+            config = load_config(fresh=True)
+            old_projects = sorted({p for p in config.get("projects", []) + [config.get("active_id")] if p} | list_result_projects())
+            # FLAG LAIN DI CONFIG (maintenance_mode, users_sharded, ...) DIBAWA; INFO MASTER LAMA DIKOSONGKAN SAMPAI MASTER BARU TER-UPLOAD
+            save_json_db(CONFIG_PATH, {**config, "active_id": new_id, "projects": old_projects + [new_id], "master_version": None, "master_shards": None})
+            save_json_db(manifest_path(new_id), {"stores": {}})
+            for p_id in old_projects: delete_project_results(p_id)
+            get_storage().delete_prefix(f"{RESULT_DIR}/Hasil_")
+            save_json_db(CONFIG_PATH, {**load_config(), "projects": [new_id]})
+            get_storage().delete_prefix(f"{REKAP_DIR}/"); cancel_rekap_jobs(); get_rekap_cache().clear()
+            get_storage().delete_prefix(f"{MASTER_SHARD_DIR}/")
+            upload_master(content, compiled)
+            reset_progress()
             done = True
         except Exception as e: st.error(f"Gagal: {e}")
         if done: st.success("✅ Master Baru Terbit!"); time.sleep(2.5); st.rerun()
@@ -203,8 +1534,10 @@ def confirm_admin_update_aktif(file_obj):
     if st.button("IYA, Update File Master", use_container_width=True):
         done = False
         try:
-            cloudinary.uploader.upload(file_obj, resource_type="raw", public_id="so_rawan_hilang/master_utama.xlsx", overwrite=True, invalidate=True)
-            st.cache_data.clear()
+            content = file_obj.getvalue()
+            upload_master(content, compile_master(content))
+            clear_rekap_state(get_active_project_id())
+            reset_progress()
             done = True
         except Exception as e: st.error(f"Gagal: {e}")
         if done:
@@ -222,27 +1555,92 @@ def maintenance_dialog():
         st.success("✅ Berhasil diubah!"); time.sleep(2.5); st.rerun()
 
 @st.dialog("Konfirmasi Simpan")
-def confirm_user_submit(data_full, toko_code, p_id):
+def confirm_user_submit(data_full, toko_code, p_id, changed=None):
     if st.button("Ya, Simpan ke Cloud", use_container_width=True):
-        buf = io.BytesIO()
-        with pd.ExcelWriter(buf, engine='openpyxl') as w: data_full.to_excel(w, index=False)
         done = False
         try:
-            p_id_file = f"so_rawan_hilang/hasil/Hasil_{toko_code}_{p_id}.xlsx"
-            cloudinary.uploader.upload(buf.getvalue(), resource_type="raw", public_id=p_id_file, overwrite=True, invalidate=True)
+            n_rows = submit_store_changes(data_full, changed, toko_code, p_id, st.session_state.user_nik)
+            save_draft(st.session_state.user_nik, toko_code, p_id, {})
+            forget_store_form()
             done = True
         except Exception as e: st.error(f"Gagal simpan: {e}")
         if done:
             st.balloons() 
-            st.success("✅ Berhasil Tersimpan!")
+            st.success(f"✅ Berhasil Tersimpan! ({n_rows} baris dikirim)")
             time.sleep(2.5)
             st.rerun()
 
+# --- DRAF INPUTAN PER (NIK, TOKO, PROJECT): DISIMPAN TIAP EDIT, BERTAHAN WALAU KONEKSI / SESI PUTUS ---
+@st.cache_resource
+def get_draft_store():
+    return {"lock": threading.Lock(), "drafts": {}}
+
+def get_draft(nik, toko_id, p_id):
+    store = get_draft_store()
+    with store["lock"]:
+        hit = store["drafts"].get((nik, toko_id, p_id))
+        return dict(hit[0]) if hit and time.time() - hit[1] < DRAFT_TTL_SECONDS else {}
+
+def save_draft(nik, toko_id, p_id, rows):
+    store = get_draft_store()
+    with store["lock"]:
+        now = time.time()
+        for k in [k for k, (_, ts) in store["drafts"].items() if now - ts > DRAFT_TTL_SECONDS]: store["drafts"].pop(k)
+        if rows: store["drafts"][(nik, toko_id, p_id)] = (dict(rows), now)
+        else: store["drafts"].pop((nik, toko_id, p_id), None)
+
+def changed_mask(edited, base, cols):
+    # BARIS YANG NILAINYA BEDA DARI HASIL TERSIMPAN (NaN = NaN DIANGGAP SAMA)
+    mask = np.zeros(len(edited), dtype=bool)
+    for c in cols:
+        new, old = pd.to_numeric(edited[c], errors='coerce').values, base[c].values
+        mask |= ~((new == old) | (pd.isna(new) & pd.isna(old)))
+    return mask
+
+# --- DATA TOKO DI SESSION: KEY (TOKO, PROJECT, VERSI MASTER), RERUN / EDIT TIDAK FETCH & PARSE ULANG ---
+def get_store_form(toko_id, p_id):
+    config = load_config()
+    key = (toko_id, p_id, config.get("master_version"), (config.get("master_shards") or {}).get("id"))
+    form = st.session_state.get("store_form")
+    if form is not None and form["key"] == key: return form
+    m_f = get_master_store(toko_id)
+    if m_f is None: return None
+    form = {"key": key, "data": None}
+    if not m_f.empty:
+        saved = load_user_save(toko_id, p_id)
+        data_in = saved
+        if data_in is None:
+            data_in = m_f
+            c_s, c_f = next((c for c in data_in.columns if 'sales' in c.lower()), 'Query Sales'), next((c for c in data_in.columns if 'fisik' in c.lower()), 'Jml Fisik')
+            data_in[c_s], data_in[c_f] = None, None
+        c_st = next((c for c in data_in.columns if 'stok' in c.lower()), 'Stok H-1')
+        c_sl = next((c for c in data_in.columns if 'sales' in c.lower()), 'Query Sales')
+        c_fi = next((c for c in data_in.columns if 'fisik' in c.lower()), 'Jml Fisik')
+        c_se = next((c for c in data_in.columns if 'selisih' in c.lower()), 'Selisih')
+        c_pr = next((c for c in data_in.columns if 'prdcd' in c.lower()), data_in.columns[4])
+        data_in[c_sl] = pd.to_numeric(data_in[c_sl], errors='coerce')
+        data_in[c_fi] = pd.to_numeric(data_in[c_fi], errors='coerce')
+        base = data_in[[c_sl, c_fi]].copy()
+        # DRAF YANG BELUM DIKIRIM DITIMPA KE DATA AWAL EDITOR; base TETAP NILAI TERSIMPAN UNTUK HITUNG DELTA
+        draft = get_draft(st.session_state.user_nik, toko_id, p_id)
+        if draft:
+            keys = norm_key(data_in[c_pr])
+            for c, i in [(c_sl, 0), (c_fi, 1)]:
+                data_in[c] = keys.map(lambda k: draft[k][i] if k in draft else np.nan).where(keys.isin(list(draft)), data_in[c]).astype(float)
+        form.update({"info": (m_f.iloc[0,1], m_f.iloc[0,2], m_f.iloc[0,3]), "data": data_in, "cols": (c_sl, c_fi, c_st, c_se),
+                     "prdcd": c_pr, "base": base, "saved": saved is not None, "restored": len(draft)})
+    st.session_state.store_form = form
+    return form
+
+def forget_store_form():
+    # DIPANGGIL SETELAH SUBMIT BERHASIL / LOGOUT; GANTI TOKO OTOMATIS LEWAT KEY
+    st.session_state.pop("store_form", None)
+
 @st.fragment
-def show_user_editor(df_full, c_sales, c_fisik, c_stok, c_selisih, toko_id, p_id):
+def show_user_editor(form, toko_id, p_id):
+    df_full, (c_sales, c_fisik, c_stok, c_selisih), c_prdcd = form["data"], form["cols"], form["prdcd"]
     display_cols = [c for c in df_full.columns if c not in [df_full.columns[0], df_full.columns[1], df_full.columns[2], df_full.columns[3]]]
-    df_full[c_sales] = pd.to_numeric(df_full[c_sales], errors='coerce')
-    df_full[c_fisik] = pd.to_numeric(df_full[c_fisik], errors='coerce')
+    if form["restored"]: st.info(f"📝 Draf yang belum dikirim dipulihkan ({form['restored']} baris).")
     edited_display = st.data_editor(
         df_full[display_cols],
         column_config={
@@ -252,6 +1650,13 @@ def show_user_editor(df_full, c_sales, c_fisik, c_stok, c_selisih, toko_id, p_id
         disabled=[c for c in display_cols if c not in [c_sales, c_fisik]],
         hide_index=True, use_container_width=True, key=f"ed_{toko_id}"
     )
+    # AUTOSAVE DRAF: HANYA BARIS YANG BEDA DARI HASIL TERSIMPAN
+    mask = changed_mask(edited_display, form["base"], [c_sales, c_fisik])
+    changed = edited_display.loc[mask]
+    draft = {k: [None if pd.isna(a) else float(a), None if pd.isna(b) else float(b)] for k, a, b in zip(norm_key(changed[c_prdcd]), changed[c_sales], changed[c_fisik])}
+    if draft != form.get("draft"):
+        save_draft(st.session_state.user_nik, toko_id, p_id, draft); form["draft"] = draft
+    if draft: st.caption(f"💾 Draf tersimpan otomatis: {len(draft)} baris berubah, belum dikirim.")
     if st.button("🚀 Simpan Laporan", type="primary", use_container_width=True):
         if edited_display[c_sales].isnull().any() or edited_display[c_fisik].isnull().any():
             st.error("⚠️ Ada kolom yang belum diisi!")
@@ -261,7 +1666,40 @@ def show_user_editor(df_full, c_sales, c_fisik, c_stok, c_selisih, toko_id, p_id
                 edited_display.insert(col_idx, col_name, df_full[col_name].values)
             vs, vf, vh = edited_display[c_sales].fillna(0).astype(int), edited_display[c_fisik].fillna(0).astype(int), edited_display[c_stok].fillna(0).astype(int)
             edited_display[c_selisih] = (vs + vf) - vh
-            confirm_user_submit(edited_display, toko_id, p_id)
+            # SUDAH PERNAH SUBMIT -> CUKUP KIRIM BARIS YANG BERUBAH
+            delta = edited_display.loc[mask, [c_prdcd, c_sales, c_fisik, c_selisih]] if form["saved"] else None
+            confirm_user_submit(edited_display, toko_id, p_id, delta)
+
+def show_rekap_job(p_id, was_running=False):
+    # DIJALANKAN SEBAGAI FRAGMENT YANG POLLING SELAMA JOB JALAN; SELESAI -> RERUN PENUH (TOMBOL AKTIF LAGI, POLLING BERHENTI)
+    job = get_rekap_job(p_id)
+    if job is None: return
+    if was_running and job["status"] != "running": st.rerun()
+    if job["status"] == "running":
+        d, t = job["done"], job["total"]
+        text = {"download": f"Download & baca hasil toko {d}/{t}" if t else "Menyiapkan rekap...", "export": f"Menulis file {job['fmt'].upper()}...", "upload": "Menyimpan file rekap...", "cancel": "Membatalkan rekap (master diperbarui)..."}[job["stage"]]
+        st.progress(d / t if t else 0.0, text=f"⏳ Rekap berjalan (mulai {job['started']}): {text}")
+    elif job["status"] == "interrupted":
+        st.warning(f"⚠️ Rekap yang dimulai {job['started']} terputus (app restart). Klik Gabung untuk mengulang.")
+    elif job["status"] == "error":
+        st.error(f"❌ Rekap gagal ({job['finished']}): {job['error']}")
+    else:
+        st.success(f"✅ Rekap {job['n_stores']} toko selesai {job['finished']}: {job['n_fetch']} toko baru/berubah diproses, {job['n_stores'] - job['n_fetch']} dari rekap sebelumnya.")
+        if job["failed"]:
+            st.warning(f"⚠️ {len(job['failed'])} toko gagal dibaca dan tidak ikut rekap:")
+            st.dataframe(pd.DataFrame([{"Kode": k, "Error": v} for k, v in job["failed"].items()]), hide_index=True, use_container_width=True)
+        storage = get_storage()
+        st.download_button("📥 Download Rekap", lambda: open_rekap_artifact(job, storage), f"Rekap_SO_{get_indonesia_date()}.{job['fmt']}", mime=EXPORT_FORMATS[job["fmt"]])
+
+def show_storage_error(e):
+    st.error(f"⚠️ Server penyimpanan sedang bermasalah, data tidak bisa dibaca. Silakan muat ulang halaman. ({e})")
+
+@contextmanager
+def render_page(name):
+    # RENDER DICATAT SEBAGAI page.{NAMA HALAMAN}; StorageError DITAMPILKAN, BUKAN HALAMAN SEOLAH DATA KOSONG
+    try:
+        with track(f"page.{name}"): yield
+    except StorageError as e: show_storage_error(e)
 
 def show_maintenance_page():
     st.markdown("<br><br>", unsafe_allow_html=True)
@@ -279,159 +1717,158 @@ def show_maintenance_page():
 for key in ['page', 'logged_in', 'user_nik', 'admin_auth', 'user_search_active', 'active_toko']:
     if key not in st.session_state: st.session_state[key] = False if 'auth' in key or 'in' in key or 'active' in key else "HOME"
 
-if is_maintenance_mode() and st.session_state.page != "ADMIN":
-    show_maintenance_page()
-else:
-    if st.session_state.page == "HOME":
-        st.title("📑 Sistem SO Rawan Hilang")
-        p_id_act = get_active_project_id()
-        if p_id_act == "BELUM_ADA_MASTER_AKTIF":
-            st.error("⚠️ Sesi SO belum dimulai. Silakan hubungi Admin.")
-        else:
-            df_m = get_master_info()
-            if df_m is not None:
-                df_full, df_am, df_as = get_progress_rankings(df_m)
-                if not df_am.empty:
-                    t_t = df_am['Target Toko SO'].sum(); s_t = df_am['Sudah SO'].sum()
-                    c1, c2, c3 = st.columns(3); c1.metric("Total Toko", t_t); c2.metric("Sudah SO", s_t, f"{(s_t/t_t):.1%}" if t_t > 0 else "0%"); c3.metric("Belum SO", t_t-s_t, delta=f"-({t_t-s_t})", delta_color="inverse")
-                    st.progress(s_t/t_t if t_t > 0 else 0)
-                    st.subheader("📊 Progres AM (Terrendah di Atas)")
-                    st.dataframe(df_am, column_config={'Progres': st.column_config.ProgressColumn(format="%d%%", min_value=0, max_value=100)}, hide_index=True, use_container_width=True)
-                    st.subheader("📊 Progres AS (Terrendah di Atas)")
-                    st.dataframe(df_as, column_config={'Progres': st.column_config.ProgressColumn(format="%d%%", min_value=0, max_value=100)}, hide_index=True, use_container_width=True)
-                    with st.expander("🔍 Detail Toko Belum SO Per AS"):
-                        list_as = sorted(df_as[df_as['Sudah SO'] < df_as['Target Toko SO']]['AS'].unique())
-                        if list_as:
-                            sel_as = st.selectbox("Pilih AS:", list_as, key="sel_as_home")
-                            if sel_as:
-                                pending_as = df_full[(df_full['AS'] == sel_as) & (df_full['Status'] == 0)]
-                                st.dataframe(pending_as[["Kode", "Nama"]], hide_index=True, use_container_width=True)
-                    with st.expander("🔍 Detail Toko Belum SO Per AM"):
-                        list_am = sorted(df_am[df_am['Sudah SO'] < df_am['Target Toko SO']]['AM'].unique())
-                        if list_am:
-                            sel_am = st.selectbox("Pilih AM:", list_am, key="sel_am_home")
-                            if sel_am:
-                                pending_am = df_full[(df_full['AM'] == sel_am) & (df_full['Status'] == 0)]
-                                st.dataframe(pending_am[["Kode", "Nama"]], hide_index=True, use_container_width=True)
-        st.divider()
-        cl1, cl2, cl3 = st.columns(3)
-        if cl1.button("🔑 LOGIN", use_container_width=True, type="primary"): st.session_state.page = "LOGIN"; st.rerun()
-        if cl2.button("📝 DAFTAR", use_container_width=True): st.session_state.page = "REGISTER"; st.rerun()
-        if cl3.button("🛡️ ADMIN", use_container_width=True): st.session_state.page = "ADMIN"; st.rerun()
-
-    elif st.session_state.page == "ADMIN":
-        hc, oc = st.columns([5, 1]); hc.header("🛡️ Admin Panel")
-        if oc.button("🚪 Logout"): st.session_state.admin_auth = False; st.session_state.page = "HOME"; st.rerun()
-        if not st.session_state.admin_auth:
-            pw = st.text_input("Admin Password:", type="password")
-            if st.button("Masuk Panel"):
-                if pw == "icnkl034": st.session_state.admin_auth = True; st.rerun()
-        else:
+try: maintenance = is_maintenance_mode() and st.session_state.page != "ADMIN"
+except StorageError as e: show_storage_error(e); st.stop()
+with render_page("MAINTENANCE" if maintenance else st.session_state.page):
+    if maintenance:
+        show_maintenance_page()
+    else:
+        if st.session_state.page == "HOME":
+            st.title("📑 Sistem SO Rawan Hilang")
             p_id_act = get_active_project_id()
-            t1, t2, t3 = st.tabs(["📤 Master & Rekap", "📊 Monitoring", "🔐 Reset PW"])
-            with t1:
-                col_u1, col_u2 = st.columns(2)
-                with col_u1:
-                    st.subheader("1. Publish Baru")
-                    f_new = st.file_uploader("Upload Master Baru", type=["xlsx"], key="up_new")
-                    if f_new and st.button("🚀 Reset & Publish Baru"): confirm_admin_publish(f_new)
-                with col_u2:
-                    st.subheader("2. Update Aktif")
-                    f_update = st.file_uploader("Upload Revisi Master", type=["xlsx"], key="up_active")
-                    if f_update and st.button("🔄 Update Revisi Master"): confirm_admin_update_aktif(f_update)
-                st.divider()
-                m_df = get_master_info()
-                if m_df is not None and p_id_act != "BELUM_ADA_MASTER_AKTIF":
-                    all_f = []
-                    next_cursor = None
-                    while True:
-                        res_raw = cloudinary.api.resources(resource_type="raw", type="upload", prefix="so_rawan_hilang/hasil/Hasil_", max_results=500, next_cursor=next_cursor)
-                        batch = [r for r in res_raw.get("resources", []) if str(p_id_act) in r["public_id"]]
-                        all_f.extend(batch)
-                        next_cursor = res_raw.get("next_cursor")
-                        if not next_cursor: break
-                    st.info(f"📊 {len(all_f)} toko sudah input.")
-                    if st.button(f"🔄 Gabung & Download ({len(all_f)} Toko)"):
-                        with st.spinner("Merging..."):
-                            m_tk, m_prd = m_df.columns[0], next((c for c in m_df.columns if 'prdcd' in c.lower()), m_df.columns[4])
-                            for r in all_f:
-                                try:
-                                    s_df = pd.read_excel(r['secure_url']); s_df.columns = [str(c).strip() for c in s_df.columns]
-                                    s_tk, s_prd = s_df.columns[0], next((c for c in s_df.columns if 'prdcd' in c.lower()), s_df.columns[4])
-                                    for _, row in s_df.iterrows():
-                                        mask = (m_df[m_tk].astype(str).str.strip() == str(row[s_tk]).strip()) & (m_df[m_prd].astype(str).str.strip() == str(row[s_prd]).strip())
-                                        if mask.any():
-                                            trgt = [c for c in s_df.columns if any(x in c.lower() for x in ['sales', 'fisik', 'selisih'])]
-                                            m_df.loc[mask, trgt] = row[trgt].values
-                                except: continue
-                            buf = io.BytesIO()
-                            with pd.ExcelWriter(buf) as w: m_df.to_excel(w, index=False)
-                            st.download_button("📥 Download Rekap", buf.getvalue(), f"Rekap_SO_{get_indonesia_date()}.xlsx")
-                st.divider()
-                if st.button("🧹 Hapus Inputan Lama"): confirm_delete_old_data(p_id_act)
-                if st.button("🛠️ PENGATURAN MAINTENANCE", use_container_width=True): maintenance_dialog()
-
-            with t2:
-                st.subheader("📊 Monitoring Akses")
-                logs = load_json_db(LOG_DB_PATH)
-                if logs:
-                    flat = [{"NIK": k, "Tanggal": t, "Hits": h} for k, d in logs.items() for t, h in d.items()]
-                    df_logs = pd.DataFrame(flat).sort_values(by="Tanggal", ascending=False)
-                    # KOMPENSASI: FITUR CARI NIK DI MONITORING
-                    search_nik = st.text_input("🔍 Cari NIK di Log:", placeholder="Masukkan 10 digit NIK...")
-                    if search_nik:
-                        df_logs = df_logs[df_logs['NIK'].str.contains(search_nik)]
-                    st.dataframe(df_logs, hide_index=True, use_container_width=True)
+            if p_id_act == "BELUM_ADA_MASTER_AKTIF":
+                st.error("⚠️ Sesi SO belum dimulai. Silakan hubungi Admin.")
+            else:
+                # DIRECTORY TOKO & MANIFEST DIAMBIL BERSAMAAN (KEDUANYA BUTUH CONFIG YANG SUDAH TERBACA DI ATAS)
+                with st.spinner("Memuat progres..."), ThreadPoolExecutor(2) as pool:
+                    directory_job = pool.submit(with_script_ctx(get_store_directory))
+                    stores_job = pool.submit(with_script_ctx(progress_stores), p_id_act)
+                    directory, stores = directory_job.result(), stores_job.result()
+                if directory is not None:
+                    progress = get_progress(directory, p_id_act, stores)
+                    t_t, s_t = progress.totals()
+                    if t_t > 0:
+                        # METRIK & PROGRESS BAR TAMPIL DULUAN, TABEL AM/AS MENYUSUL
+                        c1, c2, c3 = st.columns(3); c1.metric("Total Toko", t_t); c2.metric("Sudah SO", s_t, f"{(s_t/t_t):.1%}"); c3.metric("Belum SO", t_t-s_t, delta=f"-({t_t-s_t})", delta_color="inverse")
+                        st.progress(s_t/t_t)
+                        df_am, df_as = progress.summary("AM"), progress.summary("AS")
+                        st.subheader("📊 Progres AM (Terrendah di Atas)")
+                        st.dataframe(df_am, column_config={'Progres': st.column_config.ProgressColumn(format="%d%%", min_value=0, max_value=100)}, hide_index=True, use_container_width=True)
+                        st.subheader("📊 Progres AS (Terrendah di Atas)")
+                        st.dataframe(df_as, column_config={'Progres': st.column_config.ProgressColumn(format="%d%%", min_value=0, max_value=100)}, hide_index=True, use_container_width=True)
+                        with st.expander("🔍 Detail Toko Belum SO Per AS"):
+                            list_as = sorted(df_as[df_as['Sudah SO'] < df_as['Target Toko SO']]['AS'].unique())
+                            if list_as:
+                                sel_as = st.selectbox("Pilih AS:", list_as, key="sel_as_home")
+                                if sel_as:
+                                    st.dataframe(progress.pending("AS", sel_as), hide_index=True, use_container_width=True)
+                        with st.expander("🔍 Detail Toko Belum SO Per AM"):
+                            list_am = sorted(df_am[df_am['Sudah SO'] < df_am['Target Toko SO']]['AM'].unique())
+                            if list_am:
+                                sel_am = st.selectbox("Pilih AM:", list_am, key="sel_am_home")
+                                if sel_am:
+                                    st.dataframe(progress.pending("AM", sel_am), hide_index=True, use_container_width=True)
+            st.divider()
+            cl1, cl2, cl3 = st.columns(3)
+            if cl1.button("🔑 LOGIN", use_container_width=True, type="primary"): st.session_state.page = "LOGIN"; st.rerun()
+            if cl2.button("📝 DAFTAR", use_container_width=True): st.session_state.page = "REGISTER"; st.rerun()
+            if cl3.button("🛡️ ADMIN", use_container_width=True): st.session_state.page = "ADMIN"; st.rerun()
+
+        elif st.session_state.page == "ADMIN":
+            hc, oc = st.columns([5, 1]); hc.header("🛡️ Admin Panel")
+            if oc.button("🚪 Logout"): st.session_state.admin_auth = False; st.session_state.page = "HOME"; st.rerun()
+            if not st.session_state.admin_auth:
+                pw = st.text_input("Admin Password:", type="password")
+                if st.button("Masuk Panel"):
+                    if pw == "icnkl034": st.session_state.admin_auth = True; st.rerun()
+            else:
+                p_id_act = get_active_project_id()
+                t1, t2, t3 = st.tabs(["📤 Master & Rekap", "📊 Monitoring", "🔐 Reset PW"])
+                with t1:
+                    col_u1, col_u2 = st.columns(2)
+                    with col_u1:
+                        st.subheader("1. Publish Baru")
+                        f_new = st.file_uploader("Upload Master Baru", type=["xlsx"], key="up_new")
+                        if f_new and st.button("🚀 Reset & Publish Baru"): confirm_admin_publish(f_new)
+                    with col_u2:
+                        st.subheader("2. Update Aktif")
+                        f_update = st.file_uploader("Upload Revisi Master", type=["xlsx"], key="up_active")
+                        if f_update and st.button("🔄 Update Revisi Master"): confirm_admin_update_aktif(f_update)
+                    st.divider()
+                    master = get_master_info()
+                    if master is not None and p_id_act != "BELUM_ADA_MASTER_AKTIF":
+                        all_f = list_submissions(p_id_act)
+                        ci, cs = st.columns([4, 1]); ci.info(f"📊 {len(all_f)} toko sudah input.")
+                        if cs.button("♻️ Sinkron Manifest", use_container_width=True):
+                            with st.spinner("Membaca ulang file hasil..."): rebuild_manifest(p_id_act)
+                            reset_progress(); st.rerun()
+                        fmt = st.radio("Format Rekap:", list(EXPORT_FORMATS), horizontal=True, key="rekap_fmt")
+                        job = get_rekap_job(p_id_act); running = job is not None and job["status"] == "running"
+                        if st.button(f"🔄 Gabung Rekap ({len(all_f)} Toko)", disabled=running):
+                            with st.spinner("Mencocokkan manifest dengan file hasil..."): subs = list_submissions(p_id_act, reconcile=True)
+                            start_rekap_job(master, subs, p_id_act, fmt); st.rerun()
+                        st.fragment(run_every=REKAP_POLL_SECONDS if running else None)(show_rekap_job)(p_id_act, was_running=running)
+                    st.divider()
+                    if st.button("🧹 Hapus Inputan Lama"): confirm_delete_old_data(p_id_act)
+                    if st.button("📦 Migrasi File Hasil ke Folder Project"):
+                        with st.spinner("Memindahkan file..."): n_moved = migrate_legacy_results()
+                        if p_id_act != "BELUM_ADA_MASTER_AKTIF": rebuild_manifest(p_id_act)
+                        reset_progress(); st.success(f"✅ {n_moved} file dipindahkan.")
+                    if st.button("🛠️ PENGATURAN MAINTENANCE", use_container_width=True): maintenance_dialog()
+
+                with t2:
+                    st.subheader("📊 Monitoring Akses")
+                    logs = load_access_logs()
+                    if logs:
+                        flat = [{"NIK": k, "Tanggal": t, "Hits": h} for k, d in logs.items() for t, h in d.items()]
+                        df_logs = pd.DataFrame(flat).sort_values(by="Tanggal", ascending=False)
+                        # KOMPENSASI: FITUR CARI NIK DI MONITORING
+                        search_nik = st.text_input("🔍 Cari NIK di Log:", placeholder="Masukkan 10 digit NIK...")
+                        if search_nik:
+                            df_logs = df_logs[df_logs['NIK'].str.contains(search_nik)]
+                        st.dataframe(df_logs, hide_index=True, use_container_width=True)
+                    st.divider()
+                    st.subheader("⏱️ Performa (Sejak Proses Dimulai)")
+                    perf = get_metrics().table()
+                    if perf.empty: st.info("Belum ada data performa.")
+                    else: st.dataframe(perf, column_config={c: st.column_config.NumberColumn(format="%.1f") for c in perf.columns[3:]}, hide_index=True, use_container_width=True)
+                    bc = get_blob_cache().summary()
+                    st.caption(f"Cache file: RAM {bc['mem_items']} file ({bc['mem_mb']:.1f} MB), disk {bc['disk_items']} file ({bc['disk_mb']:.1f} MB) | hit RAM {bc['hit_mem']}, hit disk {bc['hit_disk']}, miss {bc['miss']}")
+                    st.download_button("📥 Export Metrik (Prometheus)", get_metrics().prometheus(), "so_rawan_hilang_metrics.prom", mime="text/plain")
                 
-            with t3:
-                r_nik = st.text_input("NIK reset:"); r_pw = st.text_input("Password Baru:", type="password")
-                if st.button("Simpan Password"):
-                    db = load_json_db(USER_DB_PATH)
-                    if r_nik in db: db[r_nik] = r_pw; save_json_db(USER_DB_PATH, db); st.success("Password Berhasil Di Reset!")
-
-    elif st.session_state.page == "REGISTER":
-        st.header("📝 Daftar")
-        n_nik = st.text_input("NIK (10 Digit):", max_chars=10); n_pw = st.text_input("Password Baru:", type="password")
-        if st.button("Daftar"):
-            if len(n_nik) == 10:
-                db = load_json_db(USER_DB_PATH); db[n_nik] = n_pw; save_json_db(USER_DB_PATH, db); st.success("User Berhasil Terdafta!"); time.sleep(2); st.session_state.page = "LOGIN"; st.rerun()
-        if st.button("Kembali"): st.session_state.page = "HOME"; st.rerun()
-
-    elif st.session_state.page == "LOGIN":
-        st.header("🔑 Login")
-        l_nik = st.text_input("NIK:", max_chars=10); l_pw = st.text_input("Password:", type="password")
-        if st.button("Masuk"):
-            db = load_json_db(USER_DB_PATH)
-            if l_nik in db and db[l_nik] == l_pw:
-                record_login_hit(l_nik); st.session_state.logged_in, st.session_state.user_nik, st.session_state.page = True, l_nik, "USER_INPUT"; st.rerun()
-        if st.button("Kembali"): st.session_state.page = "HOME"; st.rerun()
-        st.link_button("📲 Lupa Password? Hubungi Admin", "https://wa.me/6287725860048", use_container_width=True)
-
-    elif st.session_state.page == "USER_INPUT":
-        if not st.session_state.logged_in: st.session_state.page = "HOME"; st.rerun()
-        p_id_act = get_active_project_id()
-        if p_id_act == "BELUM_ADA_MASTER_AKTIF":
-            st.error("Sesi belum dibuka."); st.button("Logout", on_click=lambda: st.rerun())
-        else:
-            hc, oc = st.columns([5, 1]); hc.header(f"📋 Menu Input ({st.session_state.user_nik})")
-            if oc.button("🚪 Logout"): st.session_state.logged_in = False; st.session_state.user_search_active = False; st.session_state.page = "HOME"; st.rerun()
-            t_in = st.text_input("📍 Kode Toko:", max_chars=4, placeholder="Contoh TQ86").upper()
-            if st.button("🔍 Cari Data"):
-                if len(t_in) == 4: st.session_state.active_toko, st.session_state.user_search_active = t_in, True
-            if st.session_state.user_search_active:
-                df_m = get_master_info()
-                if df_m is not None:
-                    m_f = df_m[df_m[df_m.columns[0]].astype(str).str.strip() == st.session_state.active_toko].copy()
-                    if not m_f.empty:
-                        st.success(f"🏠 **{m_f.iloc[0,1]}** | 👤 AM: **{m_f.iloc[0,2]}** | 🛡️ AS: **{m_f.iloc[0,3]}**")
-                        data_in = load_user_save(st.session_state.active_toko, p_id_act)
-                        if data_in is None:
-                            data_in = m_f
-                            c_s, c_f = next((c for c in data_in.columns if 'sales' in c.lower()), 'Query Sales'), next((c for c in data_in.columns if 'fisik' in c.lower()), 'Jml Fisik')
-                            data_in[c_s], data_in[c_f] = None, None
-                        c_st = next((c for c in data_in.columns if 'stok' in c.lower()), 'Stok H-1')
-                        c_sl = next((c for c in data_in.columns if 'sales' in c.lower()), 'Query Sales')
-                        c_fi = next((c for c in data_in.columns if 'fisik' in c.lower()), 'Jml Fisik')
-                        c_se = next((c for c in data_in.columns if 'selisih' in c.lower()), 'Selisih')
-                        show_user_editor(data_in, c_sl, c_fi, c_st, c_se, st.session_state.active_toko, p_id_act)
+                with t3:
+                    r_nik = st.text_input("NIK reset:"); r_pw = st.text_input("Password Baru:", type="password")
+                    if st.button("Simpan Password"):
+                        if get_user(r_nik) is not None and save_user(r_nik, r_pw): st.success("Password Berhasil Di Reset!")
+                    st.divider()
+                    if not load_config().get("users_sharded") and st.button("📦 Migrasi users.json ke File per NIK"):
+                        with st.spinner("Memindahkan data user..."): n_ok, n_all = migrate_users()
+                        st.success(f"✅ {n_ok}/{n_all} user dipindahkan.")
+
+        elif st.session_state.page == "REGISTER":
+            st.header("📝 Daftar")
+            n_nik = st.text_input("NIK (10 Digit):", max_chars=10); n_pw = st.text_input("Password Baru:", type="password")
+            if st.button("Daftar"):
+                if len(n_nik) == 10:
+                    if save_user(n_nik, n_pw): st.success("User Berhasil Terdafta!"); time.sleep(2); st.session_state.page = "LOGIN"; st.rerun()
+                    else: st.error("Gagal menyimpan, coba lagi.")
+            if st.button("Kembali"): st.session_state.page = "HOME"; st.rerun()
+
+        elif st.session_state.page == "LOGIN":
+            st.header("🔑 Login")
+            l_nik = st.text_input("NIK:", max_chars=10); l_pw = st.text_input("Password:", type="password")
+            if st.button("Masuk"):
+                user = get_user(l_nik)
+                if user is not None and user.get("pw") == l_pw:
+                    record_login_hit(l_nik); st.session_state.logged_in, st.session_state.user_nik, st.session_state.page = True, l_nik, "USER_INPUT"; st.rerun()
+            if st.button("Kembali"): st.session_state.page = "HOME"; st.rerun()
+            st.link_button("📲 Lupa Password? Hubungi Admin", "https://wa.me/6287725860048", use_container_width=True)
+
+        elif st.session_state.page == "USER_INPUT":
+            if not st.session_state.logged_in: st.session_state.page = "HOME"; st.rerun()
+            p_id_act = get_active_project_id()
+            if p_id_act == "BELUM_ADA_MASTER_AKTIF":
+                st.error("Sesi belum dibuka."); st.button("Logout", on_click=lambda: st.rerun())
+            else:
+                hc, oc = st.columns([5, 1]); hc.header(f"📋 Menu Input ({st.session_state.user_nik})")
+                if oc.button("🚪 Logout"): st.session_state.logged_in = False; st.session_state.user_search_active = False; forget_store_form(); st.session_state.page = "HOME"; st.rerun()
+                t_in = st.text_input("📍 Kode Toko:", max_chars=4, placeholder="Contoh TQ86").upper()
+                if st.button("🔍 Cari Data"):
+                    if len(t_in) == 4: st.session_state.active_toko, st.session_state.user_search_active = t_in, True
+                if st.session_state.user_search_active:
+                    form = get_store_form(st.session_state.active_toko, p_id_act)
+                    if form is not None and form["data"] is not None:
+                        nama, am, as_ = form["info"]
+                        st.success(f"🏠 **{nama}** | 👤 AM: **{am}** | 🛡️ AS: **{as_}**")
+                        show_user_editor(form, st.session_state.active_toko, p_id_act)
 
@@ -0,0 +1,282 @@
+import argparse
+import importlib.util
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import requests
+import streamlit as st
+import streamlit.logger
+import cloudinary.api
+import cloudinary.uploader
+
+# =================================================================
+# BENCHMARK SO RAWAN HILANG (TANPA CLOUDINARY ASLI)
+# Contoh: python benchmark.py --stores 1000 --skus 50 > bench_output.txt
+# =================================================================
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+CLOUD_NAME = "bench"
+
+# =================================================================
+# 1. GENERATOR DATA SINTETIS
+# =================================================================
+def make_master(n_stores, n_skus, n_am, n_as, seed=0):
+    rng = np.random.default_rng(seed)
+    codes = [f"T{i:03X}" for i in range(n_stores)]
+    am_of = {c: f"AM_{i % n_am:02d}" for i, c in enumerate(codes)}
+    as_of = {c: f"AS_{i % n_as:03d}" for i, c in enumerate(codes)}
+    kode = np.repeat(codes, n_skus)
+    return pd.DataFrame({
+        "KODE TOKO": kode,
+        "NAMA TOKO": [f"TOKO {c}" for c in kode],
+        "AM": [am_of[c] for c in kode],
+        "AS": [as_of[c] for c in kode],
+        "PRDCD": np.tile(np.arange(10000000, 10000000 + n_skus), n_stores),
+        "DESKRIPSI": [f"BARANG {i % n_skus}" for i in range(len(kode))],
+        "Stok H-1": rng.integers(0, 50, len(kode)),
+        "Query Sales": np.nan,
+        "Jml Fisik": np.nan,
+        "Selisih": np.nan,
+    })
+
+def make_result(master_store, seed=0):
+    rng = np.random.default_rng(seed)
+    df = master_store.reset_index(drop=True).copy()
+    df["Query Sales"] = rng.integers(0, 10, len(df))
+    df["Jml Fisik"] = rng.integers(0, 50, len(df))
+    df["Selisih"] = (df["Query Sales"] + df["Jml Fisik"]) - df["Stok H-1"]
+    return df
+
+def to_xlsx(df):
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as w: df.to_excel(w, index=False)
+    return buf.getvalue()
+
+# =================================================================
+# 2. PENGGANTI CLOUDINARY LOKAL (uploader, api, URL res.cloudinary.com)
+# =================================================================
+class FakeCloudinary:
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms / 1000.0
+        self.lock = threading.Lock()
+        self.files = {}
+        self.calls = {}
+
+    def _call(self, name):
+        with self.lock: self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency: time.sleep(self.latency)
+
+    def _entry(self, public_id, content):
+        version = int(time.time() * 1000) + len(self.files)
+        return {"public_id": public_id, "version": version, "bytes": len(content), "content": content,
+                "created_at": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"), "etag": f'"{public_id}:{version}"'}
+
+    def _public(self, e):
+        return {k: v for k, v in e.items() if k != "content"} | {"secure_url": f"https://res.cloudinary.com/{CLOUD_NAME}/raw/upload/v{e['version']}/{e['public_id']}"}
+
+    # --- cloudinary.uploader ---
+    def upload(self, file, resource_type="raw", public_id=None, **kwargs):
+        self._call("uploader.upload")
+        if isinstance(file, str):
+            with open(file, "rb") as f: content = f.read()
+        else: content = file if isinstance(file, bytes) else file.getvalue() if hasattr(file, "getvalue") else file.read()
+        with self.lock: e = self.files[public_id] = self._entry(public_id, content)
+        return self._public(e)
+
+    def destroy(self, public_id, **kwargs):
+        self._call("uploader.destroy")
+        with self.lock: return {"result": "ok" if self.files.pop(public_id, None) else "not found"}
+
+    def rename(self, from_public_id, to_public_id, **kwargs):
+        self._call("uploader.rename")
+        with self.lock:
+            e = self.files.pop(from_public_id)
+            e = self.files[to_public_id] = self._entry(to_public_id, e["content"])
+        return self._public(e)
+
+    # --- cloudinary.api ---
+    def resources(self, prefix="", max_results=10, next_cursor=None, **kwargs):
+        self._call("api.resources")
+        with self.lock: ids = sorted(p for p in self.files if p.startswith(prefix or ""))
+        start = int(next_cursor or 0)
+        page = ids[start:start + max_results]
+        res = {"resources": [self._public(self.files[p]) for p in page if p in self.files]}
+        if start + max_results < len(ids): res["next_cursor"] = str(start + max_results)
+        return res
+
+    def resource(self, public_id, **kwargs):
+        self._call("api.resource")
+        if public_id not in self.files: raise cloudinary.exceptions.NotFound(f"Resource not found - {public_id}")
+        return self._public(self.files[public_id])
+
+    def subfolders(self, path, max_results=500, next_cursor=None, **kwargs):
+        self._call("api.subfolders")
+        depth = path.count("/") + 1
+        with self.lock: names = sorted({p.split("/")[depth] for p in self.files if p.startswith(f"{path}/") and p.count("/") > depth})
+        if not names and not any(p.startswith(f"{path}/") for p in self.files): raise cloudinary.exceptions.NotFound(f"Can't find folder with path {path}")
+        return {"folders": [{"name": n, "path": f"{path}/{n}"} for n in names]}
+
+    def delete_folder(self, path, **kwargs):
+        self._call("api.delete_folder")
+        return {"deleted": [path]}
+
+    def delete_resources(self, public_ids, **kwargs):
+        self._call("api.delete_resources")
+        with self.lock: return {"deleted": {p: "deleted" if self.files.pop(p, None) else "not_found" for p in public_ids[:100]}}
+
+    def delete_resources_by_prefix(self, prefix, **kwargs):
+        self._call("api.delete_resources_by_prefix")
+        with self.lock:
+            ids = sorted(p for p in self.files if p.startswith(prefix))
+            for p in ids[:1000]: self.files.pop(p)
+        res = {"deleted": {p: "deleted" for p in ids[:1000]}}
+        if len(ids) > 1000: res["partial"] = True
+        return res
+
+    # --- GET https://res.cloudinary.com/... ---
+    def http_get(self, url, headers=None, **kwargs):
+        self._call("http.get")
+        marker = f"/{CLOUD_NAME}/raw/upload/"
+        resp = requests.Response()
+        resp.url = url
+        path = url.split(marker, 1)[-1] if marker in url else ""
+        if path.startswith("v") and "/" in path and path.split("/", 1)[0][1:].isdigit(): path = path.split("/", 1)[1]
+        e = self.files.get(path)
+        if e is None:
+            resp.status_code = 404; resp._content = b""
+        elif headers and headers.get("If-None-Match") == e["etag"]:
+            resp.status_code = 304; resp._content = b""
+        else:
+            resp.status_code = 200; resp._content = e["content"]; resp.headers["ETag"] = e["etag"]
+        resp._content_consumed = True
+        return resp
+
+    def install(self):
+        for name in ["upload", "destroy", "rename"]: setattr(cloudinary.uploader, name, getattr(self, name))
+        cloudinary.uploader.upload_large = self.upload
+        for name in ["resources", "resource", "subfolders", "delete_folder", "delete_resources", "delete_resources_by_prefix"]: setattr(cloudinary.api, name, getattr(self, name))
+        fake = self
+        requests.Session.get = lambda session, url, **kwargs: fake.http_get(url, **kwargs)
+        requests.get = lambda url, **kwargs: fake.http_get(url, **kwargs)
+
+def load_app(fake=None, storage_root=None, blob_dir=None):
+    # app.py DIJALANKAN DALAM BARE MODE STREAMLIT: HALAMAN HOME IKUT TER-RENDER SEKALI, TANPA BROWSER
+    if fake:
+        fake.install()
+        st.secrets = {"cloud_name": CLOUD_NAME, "api_key": "bench", "api_secret": "bench"}
+    else:
+        st.secrets = {"storage_backend": "local", "storage_root": storage_root}
+    if blob_dir: st.secrets["blob_cache_dir"] = blob_dir
+    # BARE MODE MENULIS WARNING "missing ScriptRunContext" DI SETIAP CALL; CONFIG DI-PARSE DULU
+    # SUPAYA LEVEL LOG TIDAK DIKEMBALIKAN KE INFO SAAT PARSE
+    st.get_option("logger.level")
+    streamlit.logger.set_log_level("error")
+    spec = importlib.util.spec_from_file_location("app", APP_PATH)
+    app = importlib.util.module_from_spec(spec)
+    sys.modules["app"] = app
+    spec.loader.exec_module(app)
+    return app
+
+# =================================================================
+# 3. PENGUKURAN WAKTU & MEMORI
+# =================================================================
+def measure(name, fn, repeat, setup=None):
+    # WAKTU DIUKUR TANPA tracemalloc (OVERHEAD-NYA BESAR), PEAK MEMORI DARI SATU RUN TAMBAHAN.
+    # BUFFER PYARROW (parquet / kolom arrow) TIDAK TERLIHAT tracemalloc -> DICATAT DARI MEMORY POOL ARROW
+    # (max_memory = PEAK SEPANJANG PROSES, TIDAK BISA DI-RESET; sisa = YANG MASIH DIPEGANG SETELAH RUN)
+    times, result = [], None
+    for _ in range(repeat):
+        if setup: setup()
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    if setup: setup()
+    arrow_before = pa.total_allocated_bytes()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    row = {"Operasi": name, "Median (ms)": statistics.median(times) * 1000, "Min (ms)": min(times) * 1000,
+           "Max (ms)": max(times) * 1000, "Peak Mem (MB)": peak / 1e6, "Arrow Peak Proses (MB)": pa.default_memory_pool().max_memory() / 1e6,
+           "Arrow Sisa (MB)": (pa.total_allocated_bytes() - arrow_before) / 1e6, "Ulang": repeat}
+    return row, result
+
+def seed_storage(app, master, submitted, seed):
+    p_id = "1700000000"
+    app.save_json_db(app.CONFIG_PATH, {"active_id": p_id, "maintenance_mode": False, "projects": [p_id]})
+    content = to_xlsx(master)
+    app.upload_master(content, app.compile_master(content))
+    app.save_json_db(app.manifest_path(p_id), {"stores": {}})
+    md = app.MasterData(master)
+    for i, code in enumerate(list(md.store_index)[:submitted]):
+        app.submit_store(make_result(md.store(code), seed + i), code, p_id, "0000000000")
+    return p_id
+
+def clear_caches(app):
+    # COLD = PROSES BARU: RAM KOSONG, BLOB CACHE DISK MASIH ADA
+    blobs = app.get_blob_cache()
+    with blobs.lock: blobs.mem.clear(); blobs.mem_used = 0
+    app.reset_master(); app.get_storage().forget(); app.get_rekap_cache().clear(); app.reset_progress()
+
+def run(args):
+    fake = FakeCloudinary(latency_ms=args.latency_ms) if args.backend == "cloudinary" else None
+    app = load_app(fake, storage_root=tempfile.mkdtemp(prefix="so_bench_"), blob_dir=tempfile.mkdtemp(prefix="so_bench_blobs_"))
+    master = make_master(args.stores, args.skus, args.am, args.as_, seed=args.seed)
+    p_id = seed_storage(app, master, min(args.submitted, args.stores), args.seed)
+    rows = []
+
+    row, md = measure("get_master_info (cold)", app.get_master_info, args.repeat, setup=lambda: clear_caches(app)); rows.append(row)
+    row, _ = measure("get_master_info (warm)", app.get_master_info, args.repeat); rows.append(row)
+    row, directory = measure("get_store_directory (cold)", app.get_store_directory, args.repeat, setup=lambda: clear_caches(app)); rows.append(row)
+    row, _ = measure("get_progress (cold)", lambda: app.get_progress(directory, p_id).summary("AM"), args.repeat, setup=app.reset_progress); rows.append(row)
+    row, _ = measure("get_progress (warm)", lambda: app.get_progress(directory, p_id).summary("AM"), args.repeat); rows.append(row)
+
+    subs = app.list_submissions(p_id)
+    row, merged = measure(f"build_rekap full ({len(subs)} toko)", lambda: app.build_rekap(md, subs, p_id)[0], args.repeat, setup=lambda: app.clear_rekap_state(p_id)); rows.append(row)
+    row, _ = measure("build_rekap incremental (0 berubah)", lambda: app.build_rekap(md, subs, p_id)[0], args.repeat); rows.append(row)
+    for fmt in app.EXPORT_FORMATS:
+        row, _ = measure(f"export_rekap {fmt}", lambda: app.export_rekap(merged, fmt, "Rekap_SO_bench"), args.repeat); rows.append(row)
+
+    code = list(md.store_index)[0]
+    data = make_result(md.store(code), args.seed)
+    row, _ = measure("submit_store (1 toko)", lambda: app.submit_store(data, code, p_id, "0000000000"), args.repeat); rows.append(row)
+    row, _ = measure("get_master_store (1 toko, cold)", lambda: app.get_master_store(code), args.repeat, setup=lambda: clear_caches(app)); rows.append(row)
+    row, _ = measure("load_user_save (1 toko)", lambda: app.load_user_save(code, p_id), args.repeat); rows.append(row)
+    return rows, {**(fake.calls if fake else {}), "blob_cache": app.get_blob_cache().summary()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark operasi utama app.py dengan storage palsu lokal.")
+    parser.add_argument("--stores", type=int, default=200)
+    parser.add_argument("--skus", type=int, default=50)
+    parser.add_argument("--am", type=int, default=10)
+    parser.add_argument("--as", dest="as_", type=int, default=40)
+    parser.add_argument("--submitted", type=int, default=150, help="jumlah toko yang sudah punya file hasil")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", choices=["cloudinary", "local"], default="cloudinary", help="cloudinary = backend Cloudinary dengan API palsu, local = LocalStorage di folder temp")
+    parser.add_argument("--latency-ms", type=float, default=0, help="simulasi latency per call storage (hanya --backend cloudinary)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="output JSON (untuk dibandingkan antar commit)")
+    args = parser.parse_args()
+
+    rows, calls = run(args)
+    if args.json:
+        json.dump({"args": vars(args), "results": rows, "storage_calls": calls}, sys.stdout, indent=2)
+        print()
+    else:
+        print(f"# backend={args.backend} stores={args.stores} skus={args.skus} am={args.am} as={args.as_} submitted={args.submitted} latency={args.latency_ms}ms")
+        print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.1f}"))
+        print("\n# storage calls:", json.dumps(calls, sort_keys=True))
+
+if __name__ == "__main__":
+    main()